@@ -1,5 +1,5 @@
 from django.contrib import admin
-from authentication.models import CustomUser, OTP
+from authentication.models import CustomUser, SmsMessage
 
 class CustomUserAdmin(admin.ModelAdmin):
     list_display = ('id', 'email', 'phone_number', 'role', 'is_active', 'is_staff', 'created_at', 'updated_at')
@@ -17,5 +17,14 @@ class CustomUserAdmin(admin.ModelAdmin):
         }),
     )
 
+class SmsMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'phone_number', 'template', 'status', 'attempts', 'provider', 'created_at', 'sent_at')
+    list_filter = ('status', 'provider')
+    search_fields = ('phone_number',)
+    # variables is left out on purpose: for OTPs it is the code itself.
+    readonly_fields = ('phone_number', 'template', 'status', 'attempts', 'provider', 'last_error',
+                       'next_attempt_at', 'created_at', 'sent_at')
+    exclude = ('variables',)
+
 admin.site.register(CustomUser, CustomUserAdmin)
-admin.site.register(OTP)
+admin.site.register(SmsMessage, SmsMessageAdmin)
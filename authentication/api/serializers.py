@@ -1,13 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.utils.translation import gettext_lazy as _
-from authentication.models import CustomUser, OTP
+from authentication.models import CustomUser
+from authentication.otp import issue_otp, verify_otp
+from authentication.sms import queue_otp_sms
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.conf import settings
-import random
-import requests
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from authentication.tokens import CachedRefreshToken
 
 class LoginSerializer(serializers.Serializer):
     permission_classes = []
@@ -27,7 +27,7 @@ class LoginSerializer(serializers.Serializer):
         if not user.is_active:
             raise AuthenticationFailed('This user has been deactivated.')
         # Generate tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = CachedRefreshToken.for_user(user)
 
         return {
             'email': user.email,
@@ -55,25 +55,10 @@ class SendOTPSerializer(serializers.Serializer):
         
     def send_otp(self):
         phone_number = self.validated_data['phone_number']
-        # Generate a 6-digit OTP
-        otp_code = str(random.randint(100000, 999999))
-        # Save the OTP in the database
-        OTP.objects.create(phone_number=phone_number, otp=otp_code)
-        # Send OTP using the Fast2SMS API
-        # response = requests.get(
-        #     'https://www.fast2sms.com/dev/bulkV2',
-        #     params={
-        #         'authorization': settings.FAST2SMS_API_KEY,  # Replace with your actual API key from settings
-        #         'variables_values': otp_code,
-        #         'route': 'otp',
-        #         'numbers': phone_number[:-10]
-        #     }, headers={
-        #         'Cache-Control': 'no-cache'
-        #     }
-        # )
-        # print(response.json())
-        # if response.status_code != 200:
-        #     raise serializers.ValidationError("Failed to send OTP. Please try again later.")
+        # Generate a 6-digit OTP, kept in the cache until it expires
+        otp_code = issue_otp(phone_number)
+        # Delivery happens in the send_sms worker, off the request path.
+        queue_otp_sms(phone_number, otp_code)
         return otp_code
 
 
@@ -85,17 +70,8 @@ class VerifyOTPSerializer(serializers.Serializer):
         phone_number = data.get('phone_number')
         otp = data.get('otp')
 
-        try:
-            otp_record = OTP.objects.get(phone_number=phone_number, otp=otp, is_verified=False)
-        except OTP.DoesNotExist:
-            raise serializers.ValidationError("Invalid OTP or phone number.")
-
-        if otp_record.is_expired():
-            raise serializers.ValidationError("OTP has expired.")
-
-        # Mark the OTP as verified
-        otp_record.is_verified = True
-        otp_record.save()
+        if not verify_otp(phone_number, otp):
+            raise serializers.ValidationError("Invalid or expired OTP.")
 
         return data
 
@@ -104,7 +80,7 @@ class VerifyOTPSerializer(serializers.Serializer):
         user = CustomUser.objects.get(phone_number=phone_number, role='customer')
 
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = CachedRefreshToken.for_user(user)
 
         return {
             'refresh': str(refresh),
@@ -121,3 +97,8 @@ class UserSerializer(serializers.ModelSerializer):
     def get_name(self, obj):
         "Return the name of the user"
         return obj.get_full_name()
+
+
+class RefreshSerializer(TokenRefreshSerializer):
+    # Checks and records rotated tokens through the cached blacklist.
+    token_class = CachedRefreshToken
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from authentication.tokens import PRUNE_CHUNK, prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = ("Delete expired outstanding and blacklisted refresh tokens. "
+            "Run it regularly, e.g. daily from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=PRUNE_CHUNK)
+
+    def handle(self, *args, **options):
+        removed = prune_expired_tokens(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired tokens."))
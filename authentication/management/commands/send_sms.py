@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.sms import send_due_messages
+
+
+class Command(BaseCommand):
+    help = "Deliver queued text messages. Runs until stopped unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Send the due messages once and exit.")
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=4, help="Messages sent concurrently.")
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help="Seconds to sleep when the outbox is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            seen = send_due_messages(options['batch_size'], options['workers'])
+            if options['once']:
+                self.stdout.write(f"Sent {seen} messages.")
+                return
+            if seen < options['batch_size']:
+                time.sleep(options['interval'])
@@ -0,0 +1,54 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from authentication.jwt_authentication import CachedJWTAuthentication
+
+# Browsers cannot set headers on a websocket, so the access token travels as
+# the subprotocol pair ["jwt", "<token>"] or as a ?token= query parameter.
+JWT_SUBPROTOCOL = 'jwt'
+
+
+def get_token(scope):
+    """Return (token, subprotocol to accept) from a websocket scope."""
+    subprotocols = scope.get('subprotocols') or []
+    if JWT_SUBPROTOCOL in subprotocols:
+        position = subprotocols.index(JWT_SUBPROTOCOL)
+        if position + 1 < len(subprotocols):
+            return subprotocols[position + 1], JWT_SUBPROTOCOL
+    params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return (params.get('token') or [None])[0], None
+
+
+@database_sync_to_async
+def get_token_user(raw_token):
+    """The active user an access token belongs to, or AnonymousUser."""
+    authentication = CachedJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (AuthenticationFailed, InvalidToken):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates websocket connections from a SimpleJWT access token.
+
+    The token's signature and expiry are checked locally and the user comes
+    from the same shared cache as API requests, so a reconnect storm rarely
+    touches the database and a deactivated user cannot connect. Consumers
+    should accept with scope['subprotocol'] so browsers that sent the token
+    as a subprotocol keep the connection.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token, subprotocol = get_token(scope)
+        scope['user'] = AnonymousUser()
+        scope['subprotocol'] = subprotocol
+        if raw_token:
+            scope['user'] = await get_token_user(raw_token)
+        return await super().__call__(scope, receive, send)
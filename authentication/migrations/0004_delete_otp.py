@@ -0,0 +1,16 @@
+# Generated by Django 4.2.4 on 2026-10-19 08:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0003_alter_customuser_id'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='OTP',
+        ),
+    ]
@@ -1,9 +1,23 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.utils import timezone
-from datetime import timedelta
 from django.db import models
+from django.utils import timezone
+
+from authentication.user_cache import invalidate_user, invalidate_users
 
-class CustomUserManager(BaseUserManager):
+class CustomUserQuerySet(models.QuerySet):
+    # Bulk writes skip save() and delete(), which is what the admin's
+    # "delete selected" action and any .update() call go through.
+    def update(self, **kwargs):
+        user_ids = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        invalidate_users(user_ids)
+        return updated
+
+    def delete(self):
+        invalidate_users(list(self.values_list('pk', flat=True)))
+        return super().delete()
+
+class CustomUserManager(BaseUserManager.from_queryset(CustomUserQuerySet)):
     def create_user(self, email=None, phone_number=None, password=None, **extra_fields):
         if not email and not phone_number:
             raise ValueError('The Email or Phone number must be set')
@@ -47,6 +61,15 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.email if self.email else self.phone_number
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Requests resolve users from the cache; make them see this change.
+        invalidate_user(self.pk)
+
+    def delete(self, *args, **kwargs):
+        invalidate_user(self.pk)
+        return super().delete(*args, **kwargs)
         
     def get_full_name(self):
         return self.name
@@ -54,14 +77,35 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def get_user_id(self):
         return f"{self.id}{self.name}{self.role}"
 
-class OTP(models.Model):
+class SmsMessage(models.Model):
+    """
+    Outbox of text messages, written in the request and delivered in the
+    background by the `send_sms` command.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead')
+    ]
     phone_number = models.CharField(max_length=15)
-    otp = models.CharField(max_length=6)
-    created_at = models.DateTimeField(auto_now_add=True)
-    is_verified = models.BooleanField(default=False)
+    template = models.CharField(max_length=20, default='otp')
+    variables = models.CharField(max_length=100, blank=True)  # cleared once delivered
 
-    def is_expired(self):
-        return timezone.now() > self.created_at + timedelta(minutes=5)  # OTP valid for 5 minutes
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    provider = models.CharField(max_length=20, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
-        return f"OTP for {self.phone_number}: {self.otp} (Verified: {self.is_verified})"
+        return f"{self.template} to {self.phone_number} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='sms_due_idx'),
+        ]
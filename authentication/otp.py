@@ -0,0 +1,58 @@
+import hashlib
+import hmac
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+
+OTP_TTL = 5 * 60  # a code is valid for 5 minutes
+MAX_VERIFY_ATTEMPTS = 5  # wrong guesses before a code is burned
+
+
+def otp_key(phone_number):
+    return f'otp:{phone_number}'
+
+
+def attempts_key(phone_number):
+    return f'otp_attempts:{phone_number}'
+
+
+def digest(phone_number, code):
+    # Only a keyed hash of the code is stored, never the code itself.
+    return hmac.new(settings.SECRET_KEY.encode(), f'{phone_number}:{code}'.encode(), hashlib.sha256).hexdigest()
+
+
+def issue_otp(phone_number):
+    """
+    Generate a 6-digit code for `phone_number`, replacing any earlier one,
+    and return it. How often a phone or IP may ask is limited by the views'
+    throttles (settings.THROTTLE_RATES).
+    """
+    code = f'{secrets.randbelow(900000) + 100000}'
+    cache.set(otp_key(phone_number), digest(phone_number, code), OTP_TTL)
+    cache.set(attempts_key(phone_number), 0, OTP_TTL)
+    return code
+
+
+def verify_otp(phone_number, code):
+    """
+    Check a code and consume it on success. A code expires after OTP_TTL and
+    is burned after MAX_VERIFY_ATTEMPTS wrong guesses.
+    """
+    stored = cache.get(otp_key(phone_number))
+    if stored is None:
+        return False
+    try:
+        attempts = cache.incr(attempts_key(phone_number))
+    except ValueError:
+        attempts = MAX_VERIFY_ATTEMPTS + 1
+    if attempts > MAX_VERIFY_ATTEMPTS:
+        cache.delete_many([otp_key(phone_number), attempts_key(phone_number)])
+        return False
+    if not hmac.compare_digest(stored, digest(phone_number, code)):
+        return False
+    # Whoever deletes the code first wins, so a code can only be used once.
+    if not cache.delete(otp_key(phone_number)):
+        return False
+    cache.delete(attempts_key(phone_number))
+    return True
@@ -0,0 +1,173 @@
+import datetime
+import logging
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from authentication.models import SmsMessage
+from project.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+metrics = get_metrics('sms')
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 5
+SENDING_LEASE = datetime.timedelta(minutes=2)  # a crashed worker's claim is retried after this
+MESSAGE_TTL = datetime.timedelta(minutes=5)  # an OTP nobody received in time is useless
+
+
+class SmsError(Exception):
+    pass
+
+
+class Fast2SMSProvider:
+    name = 'fast2sms'
+    url = 'https://www.fast2sms.com/dev/bulkV2'
+
+    def __init__(self, api_key, connect_timeout=3.05, read_timeout=5, pool_size=10):
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers.update({'authorization': api_key or '', 'Cache-Control': 'no-cache'})
+
+    def send(self, message):
+        if message.template != 'otp':
+            raise SmsError(f"Unsupported template {message.template}.")
+        try:
+            response = self.session.post(self.url, timeout=self.timeout, data={
+                'route': 'otp',
+                'variables_values': message.variables,
+                # Fast2SMS wants the 10-digit national number, without +91.
+                'numbers': message.phone_number[-10:],
+            })
+            body = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise SmsError(f"Fast2SMS request failed: {e}")
+        if response.status_code != 200 or not body.get('return'):
+            raise SmsError(f"Fast2SMS rejected the message: {body.get('message', response.status_code)}")
+        return str(body.get('request_id', ''))
+
+
+class FakeSmsProvider:
+    """
+    Local stand-in that keeps sent messages in memory (`outbox`) with
+    configurable latency and failure rate, for tests and load runs.
+    """
+    name = 'fake'
+
+    def __init__(self, latency_ms=0, failure_rate=0.0):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.outbox = deque(maxlen=1000)
+
+    def send(self, message):
+        time.sleep(self.latency_ms / 1000)
+        if random.random() < self.failure_rate:
+            raise SmsError("Injected fake SMS failure.")
+        self.outbox.append((message.phone_number, message.template, message.variables))
+        logger.info("Fake SMS to %s: %s %s", message.phone_number, message.template, message.variables)
+        return f'fake-{message.pk}'
+
+
+_providers = None
+
+
+def get_providers():
+    """The configured providers in failover order, from settings.SMS_PROVIDERS."""
+    global _providers
+    if _providers is None:
+        available = {
+            'fast2sms': lambda: Fast2SMSProvider(settings.FAST2SMS_API_KEY),
+            'fake': lambda: FakeSmsProvider(settings.FAKE_SMS_LATENCY_MS, settings.FAKE_SMS_FAILURE_RATE),
+        }
+        _providers = [available[name]() for name in settings.SMS_PROVIDERS]
+    return _providers
+
+
+def queue_otp_sms(phone_number, code):
+    """Queue an OTP text; the `send_sms` worker delivers it."""
+    return SmsMessage.objects.create(phone_number=phone_number, template='otp', variables=code)
+
+
+def deliver(message, providers):
+    """
+    Runs in a worker thread, without touching the database: try each
+    provider in turn. Returns (provider name, None) or (None, error).
+    """
+    errors = []
+    for position, provider in enumerate(providers):
+        if position:
+            metrics.incr('failovers')
+        try:
+            with metrics.timer(provider.name):
+                provider.send(message)
+        except SmsError as e:
+            metrics.incr(f'{provider.name}.failed')
+            errors.append(f"{provider.name}: {e}")
+            continue
+        metrics.incr(f'{provider.name}.sent')
+        return provider.name, None
+    return None, '; '.join(errors) or "No SMS provider configured."
+
+
+def claim_due_messages(batch_size):
+    """
+    Claim up to `batch_size` due messages with a compare-and-set per row.
+    Due messages older than MESSAGE_TTL are dead-lettered instead: after a
+    worker outage their codes have expired, so there is no point sending them.
+    """
+    now = timezone.now()
+    due = SmsMessage.objects.filter(status__in=('pending', 'sending'), next_attempt_at__lte=now)
+    expired = due.filter(created_at__lt=now - MESSAGE_TTL).update(
+        status='dead', variables='', last_error="Expired before it could be sent.")
+    if expired:
+        metrics.incr('dead', expired)
+        logger.warning("Dropped %s SMS messages older than %s", expired, MESSAGE_TTL)
+    due = list(due.order_by('id')[:batch_size])
+    claimed = []
+    for message in due:
+        if SmsMessage.objects.filter(pk=message.pk, status=message.status, attempts=message.attempts).update(
+                status='sending', attempts=message.attempts + 1, next_attempt_at=now + SENDING_LEASE):
+            message.attempts += 1
+            claimed.append(message)
+    return claimed
+
+
+def record_result(message, provider_name, error):
+    now = timezone.now()
+    if provider_name:
+        message.status, message.provider, message.sent_at, message.variables = 'sent', provider_name, now, ''
+        message.last_error = None
+    elif message.attempts >= MAX_ATTEMPTS or now - message.created_at > MESSAGE_TTL:
+        message.status, message.last_error, message.variables = 'dead', error, ''
+        metrics.incr('dead')
+        logger.warning("Giving up on SMS %s: %s", message.pk, error)
+    else:
+        message.status, message.last_error = 'pending', error
+        message.next_attempt_at = now + datetime.timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (message.attempts - 1))
+    message.save(update_fields=['status', 'provider', 'sent_at', 'variables', 'last_error', 'next_attempt_at'])
+
+
+def send_due_messages(batch_size=50, workers=4):
+    """
+    Deliver the next batch of queued messages concurrently. Returns how many
+    were claimed.
+    """
+    messages = claim_due_messages(batch_size)
+    if not messages:
+        return 0
+    providers = get_providers()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda message: deliver(message, providers), messages))
+    with transaction.atomic():
+        for message, (provider_name, error) in zip(messages, results):
+            record_result(message, provider_name, error)
+    return len(messages)
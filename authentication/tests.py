@@ -1,3 +1,274 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from authentication import otp, sms
+from authentication.models import CustomUser, SmsMessage
+from project.throttling import client_ip, memory_buckets
+from authentication.tokens import CachedRefreshToken, blacklist_key, is_blacklisted, prune_expired_tokens
+from authentication.user_cache import get_cached_user, user_key
+
+
+def make_customer(phone_number='+919999999999'):
+    return CustomUser.objects.create_user(
+        email=None, password=None, role='customer', phone_number=phone_number)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = make_customer()
+
+    def refresh(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/auth/token/refresh/', {'refresh': str(token)}, format='json')
+
+    def test_rotated_token_is_rejected(self):
+        token = CachedRefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_token_blacklisted_elsewhere_is_rejected(self):
+        token = CachedRefreshToken.for_user(self.user)
+        # Cache "not blacklisted" first, as a check before the revocation would.
+        self.assertFalse(is_blacklisted(token['jti']))
+        with self.captureOnCommitCallbacks(execute=True):
+            BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_evicted_entry_falls_back_to_the_database(self):
+        token = CachedRefreshToken.for_user(self.user)
+        self.refresh(token)
+        cache.delete(blacklist_key(token['jti']))
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_unblacklisting_clears_the_cached_entry(self):
+        token = CachedRefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            token.blacklist()
+        self.assertEqual(cache.get(blacklist_key(token['jti'])), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            BlacklistedToken.objects.filter(token__jti=token['jti']).delete()
+        self.assertIsNone(cache.get(blacklist_key(token['jti'])))
+        self.assertEqual(self.refresh(token).status_code, 200)
+
+    def test_pruning_does_not_query_per_token(self):
+        for _ in range(20):
+            CachedRefreshToken.for_user(self.user).blacklist()
+        live = CachedRefreshToken.for_user(self.user)
+        OutstandingToken.objects.exclude(jti=live['jti']).update(expires_at=timezone.now() - datetime.timedelta(days=1))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(prune_expired_tokens(chunk_size=50), 20)
+        self.assertLess(len(queries), 10)
+        self.assertFalse(BlacklistedToken.objects.exists())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_customer()
+        get_cached_user(self.user.pk)
+
+    def test_queryset_update_invalidates_the_cached_user(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(cache.get(user_key(self.user.pk)))
+        self.assertFalse(get_cached_user(self.user.pk).is_active)
+
+    def test_admin_bulk_delete_invalidates_the_cached_user(self):
+        admin = CustomUser.objects.create_superuser(email='admin@example.com', password='secret')
+        self.client.force_login(admin)
+        self.client.post('/admin/authentication/customuser/', {
+            'action': 'delete_selected', '_selected_action': [self.user.pk], 'post': 'yes'})
+        self.assertIsNone(get_cached_user(self.user.pk))
+
+
+class ClientIPTests(TestCase):
+    def request(self, remote_addr, real_ip):
+        return RequestFactory().get('/', REMOTE_ADDR=remote_addr, HTTP_X_REAL_IP=real_ip)
+
+    @override_settings(TRUSTED_PROXIES=['172.28.0.10'])
+    def test_real_ip_is_taken_from_a_trusted_proxy(self):
+        self.assertEqual(client_ip(self.request('172.28.0.10', '203.0.113.7')), '203.0.113.7')
+
+    @override_settings(TRUSTED_PROXIES=['172.28.0.10'])
+    def test_real_ip_from_anyone_else_is_ignored(self):
+        self.assertEqual(client_ip(self.request('198.51.100.1', '203.0.113.7')), '198.51.100.1')
+
+    @override_settings(TRUSTED_PROXIES=['172.28.0.10'])
+    def test_spoofed_real_ip_does_not_reset_the_otp_buckets(self):
+        cache.clear()
+        memory_buckets.buckets.clear()
+        client = APIClient()
+        codes = [
+            client.post('/api/auth/send-otp/', {'phone_number': f'+9190000000{n:02}'}, format='json',
+                        REMOTE_ADDR='198.51.100.1', HTTP_X_REAL_IP=f'203.0.113.{n}').status_code
+            for n in range(settings.THROTTLE_RATES['send_otp:ip'][0] + 2)
+        ]
+        self.assertIn(429, codes)
+
+
+class OTPLimitTests(TestCase):
+    phone_number = '+919999999999'
+
+    def setUp(self):
+        cache.clear()
+        memory_buckets.buckets.clear()
+
+    def post(self, path, body, ip='203.0.113.1'):
+        return APIClient().post(path, body, format='json', REMOTE_ADDR=ip).status_code
+
+    def test_sends_per_phone_are_limited(self):
+        limit = settings.THROTTLE_RATES['send_otp:phone'][0]
+        codes = [self.post('/api/auth/send-otp/', {'phone_number': self.phone_number}, f'203.0.113.{n}')
+                 for n in range(limit + 1)]
+        self.assertEqual(codes, [200] * limit + [429])
+
+    def test_sends_per_ip_are_limited(self):
+        limit = settings.THROTTLE_RATES['send_otp:ip'][0]
+        codes = [self.post('/api/auth/send-otp/', {'phone_number': f'+9190000{n:05}'}) for n in range(limit + 1)]
+        self.assertEqual(codes, [200] * limit + [429])
+        self.assertEqual(self.post('/api/auth/send-otp/', {'phone_number': '+919000099999'}, '203.0.113.2'), 200)
+
+    def test_code_is_single_use(self):
+        code = otp.issue_otp(self.phone_number)
+        self.assertTrue(otp.verify_otp(self.phone_number, code))
+        self.assertFalse(otp.verify_otp(self.phone_number, code))
+
+    def test_code_is_burned_after_too_many_wrong_guesses(self):
+        code = otp.issue_otp(self.phone_number)
+        wrong = '000000' if code != '000000' else '111111'
+        for _ in range(otp.MAX_VERIFY_ATTEMPTS):
+            self.assertFalse(otp.verify_otp(self.phone_number, wrong))
+        self.assertFalse(otp.verify_otp(self.phone_number, code))
+        self.assertIsNone(cache.get(otp.otp_key(self.phone_number)))
+
+    def test_verifications_per_phone_are_limited(self):
+        otp.issue_otp(self.phone_number)
+        limit = settings.THROTTLE_RATES['verify_otp:phone'][0]
+        body = {'phone_number': self.phone_number, 'otp': '000000'}
+        codes = [self.post('/api/auth/verify-otp/', body, f'203.0.113.{n}') for n in range(limit + 1)]
+        self.assertEqual(codes, [400] * limit + [429])
+
+    def test_verified_code_cannot_log_in_twice(self):
+        make_customer(self.phone_number)
+        code = otp.issue_otp(self.phone_number)
+        client = APIClient()
+        body = {'phone_number': self.phone_number, 'otp': code}
+        first = client.post('/api/auth/verify-otp/', body, format='json')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('access', first.json()['tokens'])
+        self.assertEqual(client.post('/api/auth/verify-otp/', body, format='json').status_code, 400)
+
+
+class BrokenSmsProvider:
+    name = 'broken'
+
+    def send(self, message):
+        raise sms.SmsError("down")
+
+
+class SmsOutboxTests(TestCase):
+    def send(self, *providers):
+        with mock.patch('authentication.sms._providers', list(providers)):
+            return sms.send_due_messages()
+
+    def test_queued_message_is_delivered(self):
+        message = sms.queue_otp_sms('+919999999999', '123456')
+        provider = sms.FakeSmsProvider()
+        self.assertEqual(self.send(provider), 1)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.provider, message.variables), ('sent', 'fake', ''))
+        self.assertEqual(list(provider.outbox), [('+919999999999', 'otp', '123456')])
+        self.assertEqual(self.send(provider), 0)
+
+    def test_failing_provider_fails_over_to_the_next(self):
+        message = sms.queue_otp_sms('+919999999999', '123456')
+        self.send(BrokenSmsProvider(), sms.FakeSmsProvider())
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.provider), ('sent', 'fake'))
+
+    def test_failed_message_is_retried_with_backoff(self):
+        message = sms.queue_otp_sms('+919999999999', '123456')
+        before = timezone.now()
+        self.send(BrokenSmsProvider())
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.variables), ('pending', 1, '123456'))
+        self.assertIn('down', message.last_error)
+        self.assertGreaterEqual(message.next_attempt_at, before + datetime.timedelta(seconds=sms.RETRY_BASE_SECONDS))
+        # Not due yet.
+        self.assertEqual(self.send(sms.FakeSmsProvider()), 0)
+
+        SmsMessage.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+        self.send(BrokenSmsProvider())
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 2)
+        self.assertGreaterEqual(message.next_attempt_at, timezone.now() + datetime.timedelta(seconds=sms.RETRY_BASE_SECONDS))
+
+    def test_message_is_dropped_after_max_attempts(self):
+        message = sms.queue_otp_sms('+919999999999', '123456')
+        SmsMessage.objects.filter(pk=message.pk).update(attempts=sms.MAX_ATTEMPTS - 1)
+        self.send(BrokenSmsProvider())
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.variables), ('dead', sms.MAX_ATTEMPTS, ''))
+
+    def test_message_failing_past_its_ttl_is_dropped(self):
+        message = sms.queue_otp_sms('+919999999999', '123456')
+        claimed_at = message.created_at + sms.MESSAGE_TTL - datetime.timedelta(seconds=1)
+        failed_at = claimed_at + datetime.timedelta(seconds=2)
+        # Still fresh when claimed, stale by the time the attempt fails.
+        with mock.patch('authentication.sms.timezone.now', side_effect=[claimed_at, failed_at]):
+            self.send(BrokenSmsProvider())
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.variables), ('dead', ''))
+
+    def test_stale_message_is_dropped_without_sending(self):
+        message = sms.queue_otp_sms('+919999999999', '123456')
+        SmsMessage.objects.filter(pk=message.pk).update(created_at=timezone.now() - sms.MESSAGE_TTL * 2)
+        provider = sms.FakeSmsProvider()
+        self.assertEqual(self.send(provider), 0)
+        self.assertEqual(list(provider.outbox), [])
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.variables), ('dead', 0, ''))
+
+    def test_abandoned_claim_is_retried_after_the_lease(self):
+        message = sms.queue_otp_sms('+919999999999', '123456')
+        self.assertEqual(sms.claim_due_messages(10), [message])
+        self.assertEqual(sms.claim_due_messages(10), [])
+
+        SmsMessage.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.send(sms.FakeSmsProvider()), 1)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('sent', 2))
+
+
+class SendOTPViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        memory_buckets.buckets.clear()
+
+    def send_otp(self):
+        return APIClient().post('/api/auth/send-otp/', {'phone_number': '+919999999999'}, format='json')
+
+    @override_settings(DEBUG=False)
+    def test_code_is_queued_and_not_returned(self):
+        response = self.send_otp()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('otp', response.data)
+        message = SmsMessage.objects.get()
+        self.assertEqual((message.phone_number, message.status), ('+919999999999', 'pending'))
+        self.assertEqual(len(message.variables), 6)
+
+    @override_settings(DEBUG=True)
+    def test_code_is_returned_in_debug(self):
+        response = self.send_otp()
+        self.assertEqual(response.data['otp'], SmsMessage.objects.get().variables)
@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Blacklist answers are cached per jti: 1 for blacklisted, 0 for not. Signals
+# on BlacklistedToken keep the entries right however a token gets revoked
+# (rotation, the admin, a shell), and a missing entry, e.g. one Redis evicted,
+# is always answered from the database.
+NOT_BLACKLISTED_TTL = 60 * 60
+PRUNE_CHUNK = 1000
+
+
+def blacklist_key(jti):
+    return f'jwt_blacklist:{jti}'
+
+
+def remember_blacklisted(jti, expires_at):
+    # Kept until the token would have expired anyway.
+    ttl = (expires_at - timezone.now()).total_seconds()
+    if ttl > 0:
+        cache.set(blacklist_key(jti), 1, int(ttl) + 1)
+
+
+def is_blacklisted(jti):
+    cached = cache.get(blacklist_key(jti))
+    if cached is not None:
+        return bool(cached)
+    blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+    if not blacklisted:
+        # add() rather than set(): a revocation written meanwhile must win.
+        cache.add(blacklist_key(jti), 0, NOT_BLACKLISTED_TTL)
+    return blacklisted
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def blacklisted_token_saved(sender, instance, **kwargs):
+    token = instance.token
+    transaction.on_commit(lambda: remember_blacklisted(token.jti, token.expires_at))
+
+
+@receiver(post_delete, sender=BlacklistedToken)
+def blacklisted_token_deleted(sender, instance, **kwargs):
+    # Admin and manual deletes; prune_expired_tokens bypasses this.
+    jti = OutstandingToken.objects.filter(pk=instance.token_id).values_list('jti', flat=True).first()
+    if jti:
+        transaction.on_commit(lambda: cache.delete(blacklist_key(jti)))
+
+
+def prune_expired_tokens(chunk_size=PRUNE_CHUNK):
+    """
+    Delete expired outstanding tokens and their blacklist entries in chunks,
+    so no single statement locks a large part of either table. Returns the
+    number of outstanding tokens removed.
+    """
+    removed = 0
+    expired = OutstandingToken.objects.filter(expires_at__lt=timezone.now())
+    while True:
+        ids = list(expired.order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return removed
+        with transaction.atomic():
+            # A raw delete skips blacklisted_token_deleted: the tokens have
+            # expired, and so have their cache entries, so there is nothing
+            # to invalidate and no reason to load and signal every row.
+            blacklisted = BlacklistedToken.objects.filter(token_id__in=ids)
+            blacklisted._raw_delete(blacklisted.db)
+            removed += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+
+
+class CachedRefreshToken(RefreshToken):
+    """Refresh token whose blacklist checks are answered from the shared cache when possible."""
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
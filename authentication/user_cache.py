@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# Saves, deletes and queryset updates on CustomUser invalidate the entry
+# straight away. Anything that bypasses the ORM (raw SQL, another service
+# writing the table) is seen at most this long after the fact.
+USER_CACHE_TTL = 5 * 60
+
+# Everything request handling reads off request.user. The password hash and
+# other columns stay deferred and are loaded only if something touches them.
+CACHED_FIELDS = ('id', 'email', 'name', 'phone_number', 'role', 'is_active', 'is_staff', 'is_superuser')
+
+
+def user_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def get_cached_user(user_id):
+    """
+    Return the user with `user_id` built from the shared cache, loading and
+    caching its fields on a miss, or None if there is no such user.
+
+    The instance has only CACHED_FIELDS loaded, so a plain save() on it
+    writes just those fields and can never clobber the rest of the row.
+    """
+    from authentication.models import CustomUser
+
+    fields = cache.get(user_key(user_id))
+    if fields is None:
+        fields = CustomUser.objects.filter(pk=user_id).values(*CACHED_FIELDS).first()
+        if fields is None:
+            return None
+        cache.set(user_key(user_id), fields, USER_CACHE_TTL)
+    # from_db expects values in model field order.
+    names = [field.attname for field in CustomUser._meta.concrete_fields if field.attname in fields]
+    return CustomUser.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+
+
+def invalidate_user(user_id):
+    cache.delete(user_key(user_id))
+
+
+def invalidate_users(user_ids):
+    cache.delete_many([user_key(user_id) for user_id in user_ids])
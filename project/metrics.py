@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Metrics:
+    """
+    In-process counters and latency samples for one component.
+
+    Latencies keep the most recent `sample_size` observations per key, which
+    is enough for percentiles on a dashboard without unbounded growth.
+    """
+
+    def __init__(self, name, sample_size=1024):
+        self.name = name
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._samples = defaultdict(lambda: deque(maxlen=self.sample_size))
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            self._counters[key] += amount
+
+    def observe(self, key, value):
+        with self._lock:
+            self._samples[key].append(value)
+
+    @contextmanager
+    def timer(self, key):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(key, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            samples = {key: sorted(values) for key, values in self._samples.items()}
+        return {
+            'counters': counters,
+            'latency': {key: summarize(values) for key, values in samples.items() if values},
+        }
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(ordered):
+    return {
+        'count': len(ordered),
+        'p50': percentile(ordered, 0.50),
+        'p95': percentile(ordered, 0.95),
+        'p99': percentile(ordered, 0.99),
+        'max': ordered[-1],
+    }
+
+
+def get_metrics(name):
+    """Return the process-wide Metrics instance for `name`, creating it on first use."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Metrics(name)
+        return _registry[name]
+
+
+def snapshot_all():
+    with _registry_lock:
+        registry = dict(_registry)
+    return {name: metrics.snapshot() for name, metrics in registry.items()}
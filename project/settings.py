@@ -28,14 +28,38 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = os.environ.get('DJANGO_DEBUG', False)
+DEBUG = os.environ.get('DJANGO_DEBUG', 'False').lower() in ('1', 'true', 'yes')
 
 ALLOWED_HOSTS = os.getenv('DJANGO_ALLOWED_HOSTS').split(',')
 
 FAST2SMS_API_KEY=os.getenv('FAST2SMS_API_KEY')
+# SMS providers in failover order; 'fake' only logs and keeps messages in memory.
+SMS_PROVIDERS=os.getenv('SMS_PROVIDERS', 'fast2sms').split(',')
+FAKE_SMS_LATENCY_MS=float(os.getenv('FAKE_SMS_LATENCY_MS', 0))
+FAKE_SMS_FAILURE_RATE=float(os.getenv('FAKE_SMS_FAILURE_RATE', 0))
 
 CASHFREE_CLIENT_ID=os.getenv('CASHFREE_CLIENT_ID')
 CASHFREE_SECRET_KEY=os.getenv('CASHFREE_SECRET_KEY')
+CASHFREE_BASE_URL=os.getenv('CASHFREE_BASE_URL', 'https://sandbox.cashfree.com/pg')
+CASHFREE_API_VERSION='2023-08-01'
+CASHFREE_CONNECT_TIMEOUT=float(os.getenv('CASHFREE_CONNECT_TIMEOUT', 3.05))
+CASHFREE_READ_TIMEOUT=float(os.getenv('CASHFREE_READ_TIMEOUT', 10))
+CASHFREE_MAX_RETRIES=int(os.getenv('CASHFREE_MAX_RETRIES', 2))
+# Where Cashfree sends the customer after paying, and where it posts payment
+# webhooks. Override both for staging, load and integration runs.
+CASHFREE_RETURN_URL=os.getenv('CASHFREE_RETURN_URL', 'https://app.tacoza.co/order/{order_id}')
+CASHFREE_NOTIFY_URL=os.getenv('CASHFREE_NOTIFY_URL', 'https://api.tacoza.co/api/shop/cashfree/webhook/')
+
+# Local gateway stand-in (shop.fake_gateway). Point CASHFREE_BASE_URL at
+# fake://cashfree/pg to use it in-process, or at a `run_fake_gateway` server.
+# Its webhooks go to FAKE_GATEWAY_WEBHOOK_URL, else to the order's notify_url
+# (CASHFREE_NOTIFY_URL), so set one of them to this deployment.
+FAKE_GATEWAY_LATENCY_MS=float(os.getenv('FAKE_GATEWAY_LATENCY_MS', 0))
+FAKE_GATEWAY_JITTER_MS=float(os.getenv('FAKE_GATEWAY_JITTER_MS', 0))
+FAKE_GATEWAY_FAILURE_RATE=float(os.getenv('FAKE_GATEWAY_FAILURE_RATE', 0))
+FAKE_GATEWAY_PAY_AFTER=float(os.getenv('FAKE_GATEWAY_PAY_AFTER')) if os.getenv('FAKE_GATEWAY_PAY_AFTER') else None
+FAKE_GATEWAY_SUCCESS_RATE=float(os.getenv('FAKE_GATEWAY_SUCCESS_RATE', 1))
+FAKE_GATEWAY_WEBHOOK_URL=os.getenv('FAKE_GATEWAY_WEBHOOK_URL')
 
 # Application definition
 
@@ -102,6 +126,16 @@ DATABASES = {
     }
 }
 
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379')
+
+# Shared cache, Redis unless overridden (e.g. locmem for local development)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', f'{REDIS_URL}/1'),
+    }
+}
+
 # Configure channel layers using Redis
 CHANNEL_LAYERS = {
     'default': {
@@ -136,9 +170,9 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 REST_FRAMEWORK = {
+    # Public views opt out with `authentication_classes = []`.
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.jwt_authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': (
@@ -146,6 +180,27 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Scramble sequential short codes so table links can't be enumerated. Turning
+# it off makes codes, and so inserts into their unique index, ascending.
+SHORT_CODE_OBFUSCATE = os.environ.get('SHORT_CODE_OBFUSCATE', 'True').lower() in ('1', 'true', 'yes')
+
+# Proxies (addresses or networks) whose X-Real-IP header is trusted.
+TRUSTED_PROXIES = [network.strip() for network in os.getenv('TRUSTED_PROXIES', '127.0.0.1,::1').split(',') if network.strip()]
+
+# Token-bucket throttles for the public endpoints, '<throttle_scope>:<key>':
+# (requests, seconds). See project/throttling.py.
+THROTTLE_RATES = {
+    # The OTP endpoints are limited here only: 3 codes per phone per 10
+    # minutes and 20 per IP per hour, refilling continuously.
+    'send_otp:ip': (20, 60 * 60),
+    'send_otp:phone': (3, 10 * 60),
+    'verify_otp:ip': (50, 10 * 60),
+    'verify_otp:phone': (10, 10 * 60),
+    'client_menu:ip': (120, 60),
+    'cashfree_webhook:ip': (600, 60),
+    'short_url:ip': (120, 60),
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(weeks=3),
     "REFRESH_TOKEN_LIFETIME": timedelta(weeks=4),
@@ -178,7 +233,7 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "authentication.api.serializers.RefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
@@ -0,0 +1,179 @@
+import ipaddress
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import BaseThrottle
+
+from project.metrics import get_metrics
+
+metrics = get_metrics('throttle')
+
+# Refill and take one token in a single round trip. Redis' own clock is used
+# so every app process sees the same time; the key expires once a full
+# bucket would have refilled.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class MemoryBuckets:
+    """
+    Per-process token buckets, used when the cache is not Redis or Redis is
+    unreachable. Only the `max_keys` most recently used buckets are kept.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1 if not wait else tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return wait
+
+
+memory_buckets = MemoryBuckets()
+_script = None
+_redis_down_until = 0
+REDIS_RETRY_AFTER = 5  # seconds to stay on the in-memory buckets after a Redis error
+
+
+def redis_take(backend, key, rate, capacity):
+    global _script
+    if _script is None:
+        client = backend._cache.get_client(write=True)
+        # register_script() sends EVALSHA, falling back to EVAL only once per
+        # Redis restart.
+        _script = client.register_script(TOKEN_BUCKET_SCRIPT)
+    return float(_script(keys=[backend.make_key(key)], args=[rate, capacity]))
+
+
+_trusted_proxies = {}
+
+
+def is_trusted_proxy(address):
+    networks = _trusted_proxies.get(tuple(settings.TRUSTED_PROXIES))
+    if networks is None:
+        networks = [ipaddress.ip_network(network) for network in settings.TRUSTED_PROXIES]
+        _trusted_proxies[tuple(settings.TRUSTED_PROXIES)] = networks
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def client_ip(request):
+    """
+    The client's address. X-Real-IP is only believed when the connection
+    comes from a trusted proxy (nginx overwrites it with the address it saw);
+    from anyone else it is just a header an attacker can rotate.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    real_ip = request.META.get('HTTP_X_REAL_IP')
+    if real_ip and is_trusted_proxy(remote_addr):
+        return real_ip
+    return remote_addr
+
+
+def take_token(scope, ident):
+    """
+    Take a token from the `scope` bucket of `ident`. Returns 0 when the call
+    is allowed, otherwise the seconds until the next token. Scopes without a
+    configured rate are not limited.
+    """
+    policy = settings.THROTTLE_RATES.get(scope)
+    if policy is None or not ident:
+        return 0
+    requests, period = policy
+    rate, capacity = requests / period, requests
+    key = f'throttle:{scope}:{ident}'
+
+    global _redis_down_until
+    wait = None
+    backend = caches['default']
+    if isinstance(backend, RedisCache) and time.monotonic() >= _redis_down_until:
+        try:
+            wait = redis_take(backend, key, rate, capacity)
+        except Exception:
+            metrics.incr('redis_errors')
+            _redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+    if wait is None:
+        wait = memory_buckets.take(key, rate, capacity)
+    if wait:
+        metrics.incr(f'{scope}.rejected')
+    return wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token-bucket throttle for the view's `throttle_scope`, keyed by `key`.
+
+    Rates live in settings.THROTTLE_RATES as '<scope>:<key>': (requests,
+    seconds); a client may burst up to `requests` and then gets one request
+    per seconds/requests. DRF runs throttles before the handler, so a
+    rejected request never reaches the ORM.
+    """
+    key = None
+
+    def allow_request(self, request, view):
+        scope = f'{getattr(view, "throttle_scope", view.__class__.__name__)}:{self.key}'
+        self.retry_after = take_token(scope, self.get_ident(request))
+        return not self.retry_after
+
+    def get_ident(self, request):
+        raise NotImplementedError
+
+    def wait(self):
+        return math.ceil(self.retry_after)
+
+
+class IPThrottle(TokenBucketThrottle):
+    key = 'ip'
+
+    def get_ident(self, request):
+        return client_ip(request)
+
+
+class UserThrottle(TokenBucketThrottle):
+    key = 'user'
+
+    def get_ident(self, request):
+        return request.user.pk if request.user and request.user.is_authenticated else None
+
+
+class PhoneThrottle(TokenBucketThrottle):
+    """Keys on the `phone_number` in the request body; parsing it needs no database work."""
+    key = 'phone'
+
+    def get_ident(self, request):
+        phone_number = request.data.get('phone_number') if hasattr(request.data, 'get') else None
+        return str(phone_number)[:15] if phone_number else None
@@ -2,12 +2,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from project.views import MetricsAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('shortener.api.urls')),
     path('api/auth/', include('authentication.api.urls')),
     path('api/shop/', include('shop.api.urls')),
+    path('api/metrics/', MetricsAPIView.as_view(), name='metrics'),
 ]
 # add static and media urls
 if settings.DEBUG:
@@ -0,0 +1,15 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from project.metrics import snapshot_all
+
+
+class MetricsAPIView(APIView):
+    """
+    API endpoint that returns this process's counters and latency percentiles.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response(snapshot_all())
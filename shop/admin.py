@@ -17,8 +17,14 @@ from shop.models import (
     Order,
     OrderItem,
     Cart,
-    CartItem
+    CartItem,
+    OutletSalesRollup,
+    OutletItemSalesRollup,
+    ArchivedOrder,
+    KitchenQueue,
+    WebhookEvent
 )
+from shop.webhooks import requeue_events
 
 class VariantAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'category', 'description')
@@ -26,6 +32,30 @@ class VariantAdmin(admin.ModelAdmin):
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('order_id', 'status', 'table', 'outlet', 'total', 'created_at')
 
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('order_id', 'status', 'table_name', 'outlet', 'total', 'created_at')
+    list_filter = ('outlet',)
+
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'order_id', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status', 'event_type')
+    search_fields = ('order_id',)
+    readonly_fields = ('dedupe_key', 'event_type', 'order_id', 'body', 'headers', 'received_at', 'processed_at', 'last_error')
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected events")
+    def requeue(self, request, queryset):
+        count = requeue_events(queryset)
+        self.message_user(request, f"{count} events requeued.")
+
+class OutletSalesRollupAdmin(admin.ModelAdmin):
+    list_display = ('outlet', 'date', 'hour', 'order_count', 'revenue')
+    list_filter = ('outlet',)
+
+class OutletItemSalesRollupAdmin(admin.ModelAdmin):
+    list_display = ('outlet', 'food_item', 'date', 'quantity', 'revenue')
+    list_filter = ('outlet',)
+
 admin.site.register(Shop)
 admin.site.register(Outlet)
 admin.site.register(OutletImage)
@@ -42,5 +72,10 @@ admin.site.register(VariantCategory)
 admin.site.register(ItemVariant)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderItem)
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
+admin.site.register(KitchenQueue)
+admin.site.register(WebhookEvent, WebhookEventAdmin)
 admin.site.register(Cart)
 admin.site.register(CartItem)
+admin.site.register(OutletSalesRollup, OutletSalesRollupAdmin)
+admin.site.register(OutletItemSalesRollup, OutletItemSalesRollupAdmin)
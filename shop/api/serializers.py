@@ -176,7 +176,7 @@ class OutletSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Outlet
-        fields = ['id', 'name', 'menu_slug', 'description', 'address', 'location', 'minimum_order_value', 'average_preparation_time', 'email', 'phone', 'whatsapp', 'logo', 'gallery', 'shop', 'services', 'slug']
+        fields = ['id', 'name', 'menu_slug', 'description', 'address', 'location', 'minimum_order_value', 'average_preparation_time', 'email', 'phone', 'whatsapp', 'logo', 'gallery', 'shop', 'services', 'slug', 'timezone']
         depth = 2
 
     def get_menu_slug(self, obj):
@@ -254,6 +254,8 @@ class OrderSerializer(serializers.ModelSerializer):
             'total',
             'status',
             'payment_status',
+            'version',
+            'promised_at',
             'created_at',
             'updated_at']
 
@@ -276,7 +278,7 @@ class OrderSerializer(serializers.ModelSerializer):
             {
                 "stage": "Preparing Food",
                 "status": "pending" if obj.payment_status == "failed" else "inactive",
-                "content": "",
+                "content": obj.promised_at or "",
             },
             {
                 "stage": "Served",
@@ -294,6 +296,32 @@ class OrderSerializer(serializers.ModelSerializer):
         return obj.table.name if obj.table else None
 
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """Flat order representation for lists that do not need items or the outlet."""
+    table = serializers.SerializerMethodField()
+    total = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = [
+            'order_id',
+            'table',
+            'order_type',
+            'total',
+            'status',
+            'payment_status',
+            'version',
+            'created_at',
+            'updated_at']
+
+    def get_total(self, obj):
+        return float(obj.total)
+
+    def get_table(self, obj):
+        """Return the table name."""
+        return obj.table.name if obj.table else None
+
+
 class CheckoutSerializer(serializers.Serializer):
     class Meta:
         model = Order
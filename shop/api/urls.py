@@ -17,6 +17,8 @@ from shop.api.views import (
     OrderAPIView,
     LiveOrders,
     AreaAPIView,
+    SalesReportAPIView,
+    OrderExportAPIView,
     SocketSeller
 )
 from django.conf import settings
@@ -44,10 +46,12 @@ urlpatterns = [
     path('cashfree/webhook/', CashfreeWebhookView.as_view(), name='cashfree-webhook'),
     
     path('orders/', OrderAPIView.as_view(), name='orders'),
+    path('orders/export/', OrderExportAPIView.as_view(), name='orders-export'),
     path('live-orders/', LiveOrders.as_view(), name='live-orders'),
     path('live-orders/<slug:order_id>/', LiveOrders.as_view(), name='live-orders-detail'),
     path('order/<slug:order_id>/', OrderDetailAPIView.as_view(), name='orders'),
     
     path('orders/<slug:menu_slug>/', OrderAPIView.as_view(), name='orders'),
     path('subscription/', SocketSeller.as_view(), name='subscription'),
+    path('reports/sales/', SalesReportAPIView.as_view(), name='sales-report'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -13,7 +13,9 @@ from shop.models import (
     OrderItem,
     Table,
     Order,
-    TableArea)
+    TableArea,
+    OutletSalesRollup,
+    OutletItemSalesRollup)
 from shop.api.serializers import (
     FoodCategorySerializer,
     OutletSerializer,
@@ -21,39 +23,38 @@ from shop.api.serializers import (
     CartItemSerializer,
     FoodItemSerializer,
     OrderSerializer,
+    OrderSummarySerializer,
     CheckoutSerializer,
     TableSerializer,
     AreaSerializer,
     AddonCategorySerializer,
     )
+from shop.pagination import OrderCursorPagination, parse_bound
+from shop.exports import EXPORT_FORMATS, async_chunks, export_rows, stream_export
+from shop.order_status import transition_order, InvalidTransition, TransitionConflict
+from shop.webhooks import store_event
+from shop.payment_status import get_payment_status, payment_statuses
+from shop.seller_events import head_seq
+from shop.gateway import GatewayError, GatewayUnavailable, get_gateway
+from project.throttling import IPThrottle
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import permission_classes
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.db import transaction, IntegrityError
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Sum
+from django.utils.dateparse import parse_date
 from django.utils.decorators import method_decorator
 from rest_framework.decorators import api_view
 
-from cashfree_pg.models.create_order_request import CreateOrderRequest
-from cashfree_pg.api_client import Cashfree
-from cashfree_pg.models.customer_details import CustomerDetails
-from cashfree_pg.models.order_meta import OrderMeta
-
 import datetime
 import json
 
-# Cashfree API credentials
-Cashfree.XClientId = settings.CASHFREE_CLIENT_ID
-Cashfree.XClientSecret = settings.CASHFREE_SECRET_KEY
-Cashfree.XEnvironment = Cashfree.SANDBOX
-x_api_version = "2023-08-01"
-
 class MenuAPIView(APIView):
     """
     API endpoint that returns a list of categories with nested subcategories and menu items.
@@ -88,7 +89,10 @@ class ClientMenuAPIView(APIView):
     """
     API endpoint that returns a list of categories with nested subcategories and menu items for a client.
     """
+    authentication_classes = []
     permission_classes = []
+    throttle_classes = [IPThrottle]
+    throttle_scope = 'client_menu'
     def get(self, request, menu_slug, format=None):
         menu = Menu.objects.filter(menu_slug=menu_slug).first()
         categories = FoodCategory.objects.filter(menu=menu)
@@ -123,6 +127,7 @@ class GetOutletAPIView(APIView):
     """
     API endpoint that returns a list of outlets.
     """
+    authentication_classes = []
     permission_classes = []
     def get(self, request, menu_slug, format=None):
         menu = Menu.objects.filter(menu_slug=menu_slug).first()
@@ -171,6 +176,7 @@ class GetTableAPIView(APIView):
     """
     API endpoint that returns a list of tables in an outlet.
     """
+    authentication_classes = []
     permission_classes = []
     def get(self, request, menu_slug, format=None):
         menu = Menu.objects.filter(menu_slug=menu_slug).first()
@@ -184,6 +190,7 @@ class GetTableDetail(APIView):
     """
     API endpoint that returns a list of tables in an outlet.
     """
+    authentication_classes = []
     permission_classes = []
     def get(self, request, table_slug, format=None):
         table = get_object_or_404(Table, table_id=table_slug)
@@ -219,7 +226,8 @@ class GetTableSellerAPIView(APIView):
     def get(self, request, format=None):
         user = request.user
         outlet = Outlet.objects.filter(outlet_manager=user).first()
-        tables = Table.objects.filter(outlet=outlet)
+        tables = list(Table.objects.filter(outlet=outlet).select_related('url', 'area', 'outlet'))
+        Table.assign_urls(tables)
         serializer = TableSerializer(tables, many=True)
         return Response(serializer.data)
 
@@ -340,7 +348,6 @@ class CartView(APIView):
 class CheckoutAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
     def post(self, request, menu_slug):
         user = request.user
 
@@ -377,129 +384,108 @@ class CheckoutAPIView(APIView):
         }
         print(order_data, 'order_data')
 
-        # Create the order in your database
+        # Create the order in your database. It is committed before the
+        # gateway is called, so no transaction stays open over the network.
         order_serializer = CheckoutSerializer(data=order_data)
         order_serializer.is_valid(raise_exception=True)
-        order = Order.objects.create(**order_data)
-
-        # Create OrderItems from CartItems
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order=order,
-                food_item=cart_item.food_item,
-                variant=cart_item.variant,
-                quantity=cart_item.quantity
-            )
-            order_item.save()
-            order_item.addons.set(cart_item.addons.all())
-
-        # Clear the cart
-        cart.delete()
-
-        customer_details = CustomerDetails(
-                    customer_id=user.get_user_id(),
-                    customer_phone=user.phone_number[3:],
-                    customer_name=user.get_full_name(),
-                    customer_email=user.email
+        with transaction.atomic():
+            order = Order.objects.create(**order_data)
+
+            # Create OrderItems from CartItems
+            for cart_item in cart_items:
+                order_item = OrderItem(
+                    order=order,
+                    food_item=cart_item.food_item,
+                    variant=cart_item.variant,
+                    quantity=cart_item.quantity
                 )
+                order_item.save()
+                order_item.addons.set(cart_item.addons.all())
+
+        customer_details = {
+            "customer_id": user.get_user_id(),
+            "customer_phone": user.phone_number[3:],
+            "customer_name": user.get_full_name(),
+            "customer_email": user.email,
+        }
+        create_order_request = {
+            "order_id": str(order.order_id),
+            "order_amount": float(total_price),
+            "order_currency": "INR",
+            "customer_details": {key: value for key, value in customer_details.items() if value},
+            "order_meta": {
+                "return_url": settings.CASHFREE_RETURN_URL.format(order_id=order.order_id),
+                "notify_url": settings.CASHFREE_NOTIFY_URL,
+                "payment_methods": "cc,dc,upi",
+            },
+        }
 
-        create_order_request = CreateOrderRequest(
-            order_id=str(order.order_id),
-            order_amount=float(total_price),
-            order_currency="INR",
-            customer_details=customer_details
-        )
-
-        order_meta = OrderMeta()
-        order_meta.return_url = f"https://app.tacoza.co/order/{order.order_id}"
-        order_meta.notify_url = f"https://api.tacoza.co/api/shop/cashfree/webhook/"
-        order_meta.payment_methods = "cc,dc,upi"
-        create_order_request.order_meta = order_meta
-
-        # try:
-        api_response = Cashfree().PGCreateOrder(x_api_version, create_order_request, None, None)
-        print(api_response, 'response')
-        order.payment_id = api_response.data.cf_order_id
-        order.payment_session_id = api_response.data.payment_session_id
-        order.save()
+        try:
+            gateway_order = get_gateway().create_order(create_order_request)
+        except GatewayError as e:
+            # Nobody can pay for the order without a session: drop it and
+            # leave the cart as it was, so the customer can simply retry.
+            order.delete()
+            code = status.HTTP_503_SERVICE_UNAVAILABLE if isinstance(e, GatewayUnavailable) else status.HTTP_400_BAD_REQUEST
+            return Response({"detail": str(e)}, status=code)
+
+        with transaction.atomic():
+            order.payment_id = gateway_order['cf_order_id']
+            order.payment_session_id = gateway_order['payment_session_id']
+            order.save(update_fields=['payment_id', 'payment_session_id', 'updated_at'])
+            # Clear the cart
+            cart.delete()
         # Return the payment session id to the client to initiate payment
         return Response({
-            "order_id": api_response.data.order_id,
-            "payment_session_id": api_response.data.payment_session_id
+            "order_id": gateway_order['order_id'],
+            "payment_session_id": gateway_order['payment_session_id']
         }, status=status.HTTP_201_CREATED)
 
-        # except Exception as e:
-        #     return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
 
 @method_decorator(csrf_exempt, name='dispatch')
 class CashfreeWebhookView(APIView):
+    """
+    Verifies a Cashfree webhook, stores it in the inbox and acknowledges it.
+    The order is updated later by the `process_webhooks` worker.
+    """
+    authentication_classes = []
     permission_classes = [AllowAny]  # Allow webhook to be accessed without authentication
+    throttle_classes = [IPThrottle]
+    throttle_scope = 'cashfree_webhook'
 
     def post(self, request, *args, **kwargs):
-        print(request.body, 'request')
-        print(request.data, 'headers')
-        # Get raw request data
-        body = request.data
-        
         decoded_body = request.body.decode('utf-8')
 
         timestamp = request.headers.get('x-webhook-timestamp')
         signature = request.headers.get('x-webhook-signature')
 
-        # try:
-        # Verify the signature using Cashfree SDK
-        cashfree = Cashfree()
-        cashfree.PGVerifyWebhookSignature(signature, decoded_body, timestamp)
-
-        # Process payment data
-        order_id = body['data']['order']['order_id']
-        transaction_status = body['data']['payment']['payment_status']
-
-        # Handle payment success
-        if transaction_status == "SUCCESS":
-            # Update order status to 'paid'
-            order = Order.objects.get(order_id=order_id)
-            order.payment_status = 'success'
-            order.save()
-            
-            menu = Menu.objects.get(outlet=order.outlet)
-
-            # Notify the shop owner via Django Channels
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f'seller_{menu.menu_slug}',
-                {
-                    'type': 'seller_notification',
-                    'message': OrderSerializer(order).data
-                }
-            )
-        elif transaction_status == "PENDING":
-            order = Order.objects.get(order_id=order_id)
-            order.payment_status = 'pending'
-            order.save()
-        else:
-            order = Order.objects.get(order_id=order_id)
-            order.payment_status = 'failed'
-            order.save()
+        if not get_gateway().verify_webhook_signature(signature, decoded_body, timestamp):
+            return JsonResponse({"error": "Invalid signature."}, status=400)
 
-        return JsonResponse({"status": "success"})
+        try:
+            store_event(request.body, request.headers)
+        except (ValueError, AttributeError):
+            return JsonResponse({"error": "Malformed payload."}, status=400)
 
-        # except Exception as e:
-        #     print(e, 'error')
-        #     return JsonResponse({"error": str(e)}, status=400)
+        return JsonResponse({"status": "success"})
 
 
 class PaymentStatusAPIView(APIView):
+    """
+    API endpoint that returns an order's payment state from our own records,
+    refreshing it from Cashfree only when the cached answer is stale.
+    """
     permission_classes = [IsAuthenticated]
-    
+
     def get(self, request, order_id):
-        try:
-            api_response = Cashfree().PGOrderFetchPayments(x_api_version, order_id, None)
-            print(api_response.data)
-            return Response(api_response.data)
-        except Exception as e:
-            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        user = request.user
+        order = get_object_or_404(Order.objects.select_related('outlet'), order_id=order_id)
+        if order.user_id != user.id and order.outlet.outlet_manager_id != user.id:
+            return Response({"detail": "You are not authorized to view this order."}, status=status.HTTP_403_FORBIDDEN)
+        return Response(get_payment_status(order, self.fetch_payments))
+
+    def fetch_payments(self, order_id):
+        return payment_statuses(get_gateway().fetch_payments(order_id))
 
 class OrderAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -507,16 +493,18 @@ class OrderAPIView(APIView):
     def get(self, request, menu_slug=None, order_id=None):
         user = request.user
         if user.role == 'owner':
-            print("Owner")
             outlet = Outlet.objects.filter(outlet_manager=user).first()
-            orders = Order.objects.filter(outlet=outlet).order_by('-created_at')
+            orders = Order.objects.filter(outlet=outlet)
         elif menu_slug:
             menu = get_object_or_404(Menu, menu_slug=menu_slug)
-            orders = Order.objects.filter(outlet=menu.outlet, user=user).order_by('-created_at')
+            orders = Order.objects.filter(outlet=menu.outlet, user=user)
         else:
-            orders = Order.objects.filter(user=user).order_by('-created_at')
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+            orders = Order.objects.filter(user=user)
+
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(orders.select_related('user', 'outlet', 'table'), request, view=self)
+        serializer = OrderSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class OrderDetailAPIView(APIView):
@@ -534,52 +522,155 @@ class OrderDetailAPIView(APIView):
 
 class LiveOrders(APIView):
     permission_classes = [IsAuthenticated]
+    completed_limit = 20
+    max_completed_limit = 100
+
     def get(self, request):
         user = request.user
         outlet = Outlet.objects.filter(outlet_manager=user).first()
-        # return all orders of current date categorised by status
-        orders = Order.objects.filter(outlet=outlet, created_at__date=datetime.datetime.now().date()).order_by('-created_at')
-        serializer = OrderSerializer(orders, many=True)
+        if outlet is None:
+            return Response({"detail": "Outlet not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        # Read the event log head first: a tablet resuming from it may see an
+        # event twice, but never misses one that raced with this snapshot.
+        seq = head_seq(outlet.id)
+
+        # Today's orders in the outlet's timezone, as a plain range on created_at
+        # so that every bucket is a scan of the (outlet, status, created_at) index.
+        start, end = outlet.get_day_bounds()
+        todays_orders = Order.objects.filter(outlet=outlet, created_at__gte=start, created_at__lt=end)
+
+        try:
+            completed_limit = int(request.query_params.get('completed_limit', self.completed_limit))
+        except ValueError:
+            completed_limit = self.completed_limit
+        completed_limit = max(0, min(completed_limit, self.max_completed_limit))
+
+        active = todays_orders.select_related('user', 'outlet', 'table').order_by('-created_at')
+        completed = todays_orders.filter(status='completed').select_related('table').order_by('-created_at')
+
         live_orders = {
-            "newOrders": [],
-            "preparing": [],
-            "completed": []
+            "newOrders": OrderSerializer(active.filter(status='pending'), many=True).data,
+            "preparing": OrderSerializer(active.filter(status='processing'), many=True).data,
+            "completed": OrderSummarySerializer(completed[:completed_limit], many=True).data,
+            "completedCount": completed.count(),
+            "seq": seq,
         }
-        for order in serializer.data:
-            if order['status'] == 'pending':
-                live_orders['newOrders'].append(order)
-            elif order['status'] == 'processing':
-                live_orders['preparing'].append(order)
-            elif order['status'] == 'completed':
-                live_orders['completed'].append(order)
         return Response(live_orders, status=status.HTTP_200_OK)
 
+    status_messages = {
+        'processing': "Order is being prepared.",
+        'completed': "Order completed successfully.",
+        'cancelled': "Order cancelled.",
+    }
+
     def put(self, request, order_id):
         user = request.user
-        order = get_object_or_404(Order, order_id=order_id)
+        order = get_object_or_404(Order.objects.select_related('outlet'), order_id=order_id)
         if order.outlet.outlet_manager != user:
             return Response({"detail": "You are not authorized to update this order."}, status=status.HTTP_403_FORBIDDEN)
-        data = request.data
 
-        if data['status'] == 'completed':
-            order.status = 'completed'
-            order.updated_at = datetime.datetime.now()
-            order.save()
-            return Response({"message": "Order completed successfully."}, status=status.HTTP_200_OK)
-
-        elif data['status'] == 'processing':
-            order.status = 'processing'
-            order.updated_at = datetime.datetime.now()
-            order.save()
-            return Response({"message": "Order is being prepared."}, status=status.HTTP_200_OK)
-
-        elif data['status'] == 'pending':
-            order.status = 'pending'
-            order.updated_at = datetime.datetime.now()
-            order.save()
-            return Response({"message": "Order is pending."}, status=status.HTTP_200_OK)
-
-        return Response({"detail": "Invalid status."}, status=status.HTTP_400_BAD_REQUEST)
+        new_status = request.data.get('status')
+        if new_status not in self.status_messages:
+            return Response({"detail": "Invalid status."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            transition_order(order, new_status)
+        except InvalidTransition as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except TransitionConflict as e:
+            current = Order.objects.filter(pk=order.pk).values_list('status', flat=True).first()
+            return Response({"detail": str(e), "status": current}, status=status.HTTP_409_CONFLICT)
+
+        return Response({"message": self.status_messages[new_status]}, status=status.HTTP_200_OK)
+
+
+class OrderExportAPIView(APIView):
+    """
+    API endpoint that streams the owner's order lines as CSV or JSON.
+    Rows are read through a server-side cursor, so memory stays flat however long the range.
+    """
+    permission_classes = [IsAuthenticated]
+    content_types = {
+        'csv': 'text/csv',
+        'json': 'application/json',
+    }
+
+    def get(self, request):
+        user = request.user
+        outlet = Outlet.objects.filter(outlet_manager=user).first()
+        if outlet is None:
+            return Response({"detail": "Outlet not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({"detail": "file_format must be csv or json."}, status=status.HTTP_400_BAD_REQUEST)
+        start = parse_bound(request.query_params.get('from'), 'from')
+        end = parse_bound(request.query_params.get('to'), 'to')
+
+        content = stream_export(export_rows(outlet, start, end), file_format)
+        if isinstance(request._request, ASGIRequest):
+            content = async_chunks(content)
+        response = StreamingHttpResponse(content, content_type=self.content_types[file_format])
+        response['Content-Disposition'] = f'attachment; filename="orders-{outlet.slug}.{file_format}"'
+        return response
+
+
+class SalesReportAPIView(APIView):
+    """
+    API endpoint that returns revenue, order counts and top items for the owner's outlet.
+    Reads only the sales rollup tables.
+    """
+    permission_classes = [IsAuthenticated]
+    default_days = 7
+    top_items_limit = 10
+
+    def get(self, request):
+        user = request.user
+        outlet = Outlet.objects.filter(outlet_manager=user).first()
+        if outlet is None:
+            return Response({"detail": "Outlet not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        end = parse_date(request.query_params.get('to', '')) or outlet.get_day_bounds()[0].date()
+        start = parse_date(request.query_params.get('from', '')) or end - datetime.timedelta(days=self.default_days - 1)
+        if start > end:
+            return Response({"detail": "'from' must not be after 'to'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        hourly = OutletSalesRollup.objects.filter(outlet=outlet, date__gte=start, date__lte=end)
+        daily = hourly.values('date').annotate(
+            revenue=Sum('revenue'), order_count=Sum('order_count')).order_by('date')
+        totals = hourly.aggregate(revenue=Sum('revenue'), order_count=Sum('order_count'))
+        top_items = OutletItemSalesRollup.objects.filter(
+            outlet=outlet, date__gte=start, date__lte=end
+        ).values('food_item_id', 'food_item__name').annotate(
+            quantity=Sum('quantity'), revenue=Sum('revenue')
+        ).order_by('-revenue')[:self.top_items_limit]
+
+        return Response({
+            "from": start,
+            "to": end,
+            "totals": {
+                "revenue": float(totals['revenue'] or 0),
+                "order_count": totals['order_count'] or 0,
+            },
+            "daily": [
+                {"date": row['date'], "revenue": float(row['revenue']), "order_count": row['order_count']}
+                for row in daily
+            ],
+            "hourly": [
+                {"date": row.date, "hour": row.hour, "revenue": float(row.revenue), "order_count": row.order_count}
+                for row in hourly
+            ],
+            "top_items": [
+                {
+                    "id": row['food_item_id'],
+                    "name": row['food_item__name'],
+                    "quantity": row['quantity'],
+                    "revenue": float(row['revenue']),
+                }
+                for row in top_items
+            ],
+        }, status=status.HTTP_200_OK)
 
 
 class SocketSeller(APIView):
@@ -0,0 +1,137 @@
+import datetime
+import gzip
+import json
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from shop.models import ArchivedOrder, Order
+
+ARCHIVE_TABLE = ArchivedOrder._meta.db_table
+
+
+def is_partitioned():
+    return connection.vendor == 'postgresql'
+
+
+def month_start(value):
+    """Return the first instant (UTC) of the month containing `value`."""
+    value = value.astimezone(datetime.timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(start):
+    return (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+def months_ago(months, now=None):
+    """Return the start of the month `months` months before the current one."""
+    start = month_start(now or timezone.now())
+    for _ in range(months):
+        start = (start - datetime.timedelta(days=1)).replace(day=1)
+    return start
+
+
+def partition_name(start):
+    return f"{ARCHIVE_TABLE}_y{start.year}m{start.month:02d}"
+
+
+def ensure_partition(start):
+    """Create the monthly partition that holds `start`, if it does not exist yet."""
+    if not is_partitioned():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{partition_name(start)}" PARTITION OF "{ARCHIVE_TABLE}" '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [start, next_month(start)],
+        )
+
+
+def archive_row(order):
+    """Build the denormalised archive copy of a hot order and its items."""
+    return ArchivedOrder(
+        order_id=order.order_id,
+        payment_id=order.payment_id,
+        transaction_id=order.transaction_id,
+        user_id=order.user_id,
+        outlet_id=order.outlet_id,
+        table_name=order.table.name if order.table else None,
+        cooking_instructions=order.cooking_instructions,
+        order_type=order.order_type,
+        total=order.total,
+        status=order.status,
+        payment_status=order.payment_status,
+        transaction_status=order.transaction_status,
+        items=[
+            {
+                'food_item_id': item.food_item_id,
+                'name': item.food_item.name,
+                'variant': item.variant.name if item.variant else None,
+                'quantity': item.quantity,
+                'addons': [addon.name for addon in item.addons.all()],
+            }
+            for item in order.items.all()
+        ],
+        created_at=order.created_at,
+        updated_at=order.updated_at,
+    )
+
+
+def archive_orders(before, batch_size=500):
+    """
+    Move every order created before `before` out of the hot tables.
+
+    Works oldest first in batches; each batch is copied into the archive and
+    deleted from Order/OrderItem in one transaction. Returns the number of
+    orders moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Order.objects.filter(created_at__lt=before)
+                .select_related('table')
+                .prefetch_related('items__food_item', 'items__variant', 'items__addons')
+                .order_by('created_at', 'order_id')[:batch_size]
+            )
+            if not batch:
+                return moved
+            for start in {month_start(order.created_at) for order in batch}:
+                ensure_partition(start)
+            ArchivedOrder.objects.bulk_create([archive_row(order) for order in batch], ignore_conflicts=True)
+            Order.objects.filter(pk__in=[order.pk for order in batch]).delete()
+        moved += len(batch)
+
+
+def export_month(start, directory):
+    """Write one month of archived orders to a gzipped JSON-lines file and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"orders-{start:%Y-%m}.jsonl.gz")
+    rows = ArchivedOrder.objects.filter(
+        created_at__gte=start, created_at__lt=next_month(start)
+    ).order_by('created_at', 'order_id').values()
+    with gzip.open(path, 'wt', encoding='utf-8') as handle:
+        for row in rows.iterator(chunk_size=2000):
+            handle.write(json.dumps(row, cls=DjangoJSONEncoder))
+            handle.write('\n')
+    return path
+
+
+def drop_month(start):
+    """Remove one month from the archive, detaching and dropping its partition on PostgreSQL."""
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{ARCHIVE_TABLE}" DETACH PARTITION "{partition_name(start)}"')
+            cursor.execute(f'DROP TABLE "{partition_name(start)}"')
+    else:
+        ArchivedOrder.objects.filter(created_at__gte=start, created_at__lt=next_month(start)).delete()
+
+
+def archived_months(before):
+    """Return the start of every archived month that ends on or before `before`."""
+    months = ArchivedOrder.objects.filter(created_at__lt=before).datetimes(
+        'created_at', 'month', tzinfo=datetime.timezone.utc)
+    return [start for start in months if next_month(start) <= before]
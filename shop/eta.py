@@ -0,0 +1,77 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from shop.models import KitchenQueue, Order
+
+
+def estimate_prep_minutes(order):
+    """Items cook side by side, so an order takes as long as its slowest item."""
+    longest = order.items.aggregate(longest=Max('food_item__prepration_time'))['longest']
+    return longest or order.outlet.average_preparation_time
+
+
+def locked_queue(outlet_id):
+    queue, _ = KitchenQueue.objects.get_or_create(outlet_id=outlet_id)
+    return KitchenQueue.objects.select_for_update().get(pk=queue.pk)
+
+
+def save_eta(order, **fields):
+    Order.objects.filter(pk=order.pk).update(**fields)
+    for field, value in fields.items():
+        setattr(order, field, value)
+
+
+@transaction.atomic
+def enqueue_order(order):
+    """
+    Put a newly paid order at the back of its outlet's kitchen queue and
+    promise a ready time. Orders are only queued once their payment
+    succeeds, so failed or abandoned checkouts never hold kitchen time.
+    Calling it again for a queued order (a repeated webhook) does nothing.
+
+    The queue only remembers when its current work clears (busy_until). A new
+    order starts then, or now if the kitchen is idle, and pushes busy_until
+    back by its share of the kitchen's stations. Because the start is clamped
+    to now, work from abandoned orders stops counting once its time passes.
+    """
+    queue = locked_queue(order.outlet_id)
+    # The queue lock serialises this check against concurrent enqueues.
+    queued = Order.objects.filter(pk=order.pk).values_list('prep_estimate', 'promised_at').first()
+    if queued and queued[0] is not None:
+        order.prep_estimate, order.promised_at = queued
+        return order.promised_at
+    now = timezone.now()
+    estimate = estimate_prep_minutes(order)
+    start = max(now, queue.busy_until or now)
+    queue.busy_until = start + datetime.timedelta(minutes=estimate / queue.stations)
+    queue.open_orders += 1
+    queue.save(update_fields=['busy_until', 'open_orders', 'updated_at'])
+    save_eta(order, prep_estimate=estimate, promised_at=start + datetime.timedelta(minutes=estimate))
+    return order.promised_at
+
+
+def start_order(order):
+    """Re-promise an order once the kitchen actually starts cooking it."""
+    if order.prep_estimate is None:
+        return None
+    started = order.prep_start_time or timezone.now()
+    save_eta(order, promised_at=started + datetime.timedelta(minutes=order.prep_estimate))
+    return order.promised_at
+
+
+@transaction.atomic
+def release_order(order):
+    """Take a finished or cancelled order out of the queue, freeing any time it had left."""
+    if order.prep_estimate is None:
+        return
+    now = timezone.now()
+    queue = locked_queue(order.outlet_id)
+    if order.promised_at and queue.busy_until:
+        remaining = min(max(order.promised_at - now, datetime.timedelta(0)),
+                        datetime.timedelta(minutes=order.prep_estimate))
+        queue.busy_until = max(now, queue.busy_until - remaining / queue.stations)
+    queue.open_orders = max(queue.open_orders - 1, 0)
+    queue.save(update_fields=['busy_until', 'open_orders', 'updated_at'])
@@ -0,0 +1,79 @@
+import csv
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from shop.models import OrderItem
+
+# One row per order line; the order columns repeat on each of its lines.
+EXPORT_FIELDS = [
+    ('order_id', 'order__order_id'),
+    ('created_at', 'order__created_at'),
+    ('status', 'order__status'),
+    ('payment_status', 'order__payment_status'),
+    ('order_type', 'order__order_type'),
+    ('table', 'order__table__name'),
+    ('customer', 'order__user__name'),
+    ('order_total', 'order__total'),
+    ('item', 'food_item__name'),
+    ('variant', 'variant__name'),
+    ('quantity', 'quantity'),
+    ('item_price', 'food_item__price'),
+]
+EXPORT_FORMATS = ('csv', 'json')
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() hands the line back instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def export_rows(outlet, start=None, end=None):
+    """Iterate over the flattened order lines of an outlet, oldest first, without loading them all."""
+    items = OrderItem.objects.filter(order__outlet=outlet)
+    if start:
+        items = items.filter(order__created_at__gte=start)
+    if end:
+        items = items.filter(order__created_at__lt=end)
+    items = items.order_by('order__created_at', 'order__order_id', 'id')
+    return items.values_list(*[lookup for _, lookup in EXPORT_FIELDS]).iterator(chunk_size=CHUNK_SIZE)
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_FIELDS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_json(rows):
+    names = [name for name, _ in EXPORT_FIELDS]
+    separator = '['
+    for row in rows:
+        yield separator + json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder)
+        separator = ',\n'
+    yield '[]\n' if separator == '[' else ']\n'
+
+
+def stream_export(rows, file_format):
+    return stream_csv(rows) if file_format == 'csv' else stream_json(rows)
+
+
+async def async_chunks(chunks, batch_size=100):
+    """
+    Serve a sync chunk iterator under ASGI without buffering it.
+
+    Django consumes a sync iterator passed to StreamingHttpResponse under ASGI
+    into a list first. Instead, pull `batch_size` chunks at a time on the
+    thread-sensitive executor, which keeps the server-side cursor on one thread.
+    """
+    next_batch = sync_to_async(lambda: list(itertools.islice(chunks, batch_size)))
+    while True:
+        batch = await next_batch()
+        if not batch:
+            return
+        yield ''.join(batch)
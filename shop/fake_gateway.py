@@ -0,0 +1,267 @@
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.conf import settings
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+ORDER_PATH = re.compile(r'^/orders/(?P<order_id>[^/]+)(?P<action>/payments|/pay)?$')
+
+
+def sign_webhook(secret, timestamp, raw_body):
+    """Sign a webhook body the way Cashfree does: base64(HMAC-SHA256(timestamp + body))."""
+    digest = hmac.new(secret.encode('utf-8'), f'{timestamp}{raw_body}'.encode('utf-8'), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+
+class FakeGateway:
+    """
+    A stand-in for the Cashfree PG API, for load and integration tests.
+
+    Implements order creation (idempotent on x-idempotency-key), fetching an
+    order's payments, and signed payment webhooks. Customers "pay" either
+    automatically `pay_after` seconds after the order is created, or when
+    POST /orders/<order_id>/pay is called. Every API call waits `latency_ms`
+    +/- `jitter_ms` and fails with a 503 with probability `failure_rate`.
+    """
+
+    def __init__(self, client_secret, latency_ms=0, jitter_ms=0, failure_rate=0.0,
+                 pay_after=None, success_rate=1.0, webhook_url=None, deliver=None):
+        self.client_secret = client_secret or ''
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.pay_after = pay_after
+        self.success_rate = success_rate
+        self.webhook_url = webhook_url
+        self.deliver = deliver or self.post_webhook
+        self.orders = {}
+        self.payments = {}
+        self.idempotent_responses = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, **overrides):
+        options = {
+            'client_secret': settings.CASHFREE_SECRET_KEY,
+            'latency_ms': settings.FAKE_GATEWAY_LATENCY_MS,
+            'jitter_ms': settings.FAKE_GATEWAY_JITTER_MS,
+            'failure_rate': settings.FAKE_GATEWAY_FAILURE_RATE,
+            'pay_after': settings.FAKE_GATEWAY_PAY_AFTER,
+            'success_rate': settings.FAKE_GATEWAY_SUCCESS_RATE,
+            'webhook_url': settings.FAKE_GATEWAY_WEBHOOK_URL,
+        }
+        options.update(overrides)
+        return cls(**options)
+
+    def latency(self):
+        return max(0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def handle(self, method, path, headers, body):
+        """Answer one API call. Returns (status_code, payload); latency is left to the transport."""
+        if headers.get('x-client-secret') != self.client_secret:
+            return 401, {'message': 'authentication Failed', 'type': 'authentication_error'}
+        if random.random() < self.failure_rate:
+            return 503, {'message': 'injected failure', 'type': 'api_error'}
+
+        if method == 'POST' and path == '/orders':
+            return self.create_order(json.loads(body or '{}'), headers.get('x-idempotency-key'))
+        match = ORDER_PATH.match(path)
+        if match and method == 'GET' and match['action'] == '/payments':
+            return self.fetch_payments(match['order_id'])
+        if match and method == 'GET' and not match['action']:
+            return self.fetch_order(match['order_id'])
+        if match and method == 'POST' and match['action'] == '/pay':
+            payload = json.loads(body or '{}')
+            return self.pay(match['order_id'], payload.get('payment_status'))
+        return 404, {'message': 'Not found', 'type': 'invalid_request_error'}
+
+    def create_order(self, payload, idempotency_key=None):
+        with self._lock:
+            if idempotency_key and idempotency_key in self.idempotent_responses:
+                return self.idempotent_responses[idempotency_key]
+            order_id = payload.get('order_id') or f'order_{uuid.uuid4().hex}'
+            if order_id in self.orders:
+                response = 409, {'message': 'order with same id is already present', 'type': 'invalid_request_error'}
+            else:
+                order = {
+                    'cf_order_id': str(random.randint(10 ** 9, 10 ** 10 - 1)),
+                    'order_id': order_id,
+                    'order_amount': payload.get('order_amount'),
+                    'order_currency': payload.get('order_currency', 'INR'),
+                    'order_status': 'ACTIVE',
+                    'payment_session_id': f'session_{uuid.uuid4().hex}',
+                    'customer_details': payload.get('customer_details', {}),
+                    'order_meta': payload.get('order_meta', {}),
+                    'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                }
+                self.orders[order_id] = order
+                self.payments[order_id] = []
+                response = 200, order
+            if idempotency_key:
+                self.idempotent_responses[idempotency_key] = response
+
+        if response[0] == 200 and self.pay_after is not None:
+            timer = threading.Timer(self.pay_after, self.pay, args=(order_id,))
+            timer.daemon = True
+            timer.start()
+        return response
+
+    def fetch_order(self, order_id):
+        with self._lock:
+            order = self.orders.get(order_id)
+        if order is None:
+            return 404, {'message': 'order not found', 'type': 'invalid_request_error'}
+        return 200, order
+
+    def fetch_payments(self, order_id):
+        with self._lock:
+            if order_id not in self.orders:
+                return 404, {'message': 'order not found', 'type': 'invalid_request_error'}
+            return 200, list(self.payments[order_id])
+
+    def pay(self, order_id, payment_status=None):
+        """Record a payment attempt for an order and send its webhook."""
+        if payment_status is None:
+            payment_status = 'SUCCESS' if random.random() < self.success_rate else 'FAILED'
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                return 404, {'message': 'order not found', 'type': 'invalid_request_error'}
+            payment = {
+                'cf_payment_id': str(random.randint(10 ** 9, 10 ** 10 - 1)),
+                'order_id': order_id,
+                'payment_status': payment_status,
+                'payment_amount': order['order_amount'],
+                'payment_currency': order['order_currency'],
+                'payment_time': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            }
+            self.payments[order_id].append(payment)
+            if payment_status == 'SUCCESS':
+                order['order_status'] = 'PAID'
+        self.send_webhook(order, payment)
+        return 200, payment
+
+    def send_webhook(self, order, payment):
+        body = json.dumps({
+            'data': {
+                'order': {
+                    'order_id': order['order_id'],
+                    'order_amount': order['order_amount'],
+                    'order_currency': order['order_currency'],
+                },
+                'payment': payment,
+                'customer_details': order['customer_details'],
+            },
+            'event_time': payment['payment_time'],
+            'type': 'PAYMENT_SUCCESS_WEBHOOK' if payment['payment_status'] == 'SUCCESS' else 'PAYMENT_FAILED_WEBHOOK',
+        })
+        timestamp = str(int(time.time() * 1000))
+        headers = {
+            'Content-Type': 'application/json',
+            'x-webhook-timestamp': timestamp,
+            'x-webhook-signature': sign_webhook(self.client_secret, timestamp, body),
+            'x-webhook-version': settings.CASHFREE_API_VERSION,
+        }
+        url = self.webhook_url or order['order_meta'].get('notify_url')
+        try:
+            self.deliver(url, body, headers)
+        except Exception:
+            logger.exception("Fake gateway could not deliver webhook for %s", order['order_id'])
+
+    def post_webhook(self, url, body, headers):
+        requests.post(url, data=body.encode('utf-8'), headers=headers, timeout=10)
+
+
+class FakeGatewayAdapter(BaseAdapter):
+    """
+    A requests transport that answers from a FakeGateway in-process, so a
+    client whose base URL is e.g. fake://cashfree/pg never leaves the process.
+    A simulated latency longer than the read timeout raises ReadTimeout.
+    """
+
+    def __init__(self, gateway, prefix):
+        super().__init__()
+        self.gateway = gateway
+        self.prefix = prefix.rstrip('/')
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        delay = self.gateway.latency()
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        if read_timeout is not None and delay > read_timeout:
+            time.sleep(read_timeout)
+            raise requests.ReadTimeout(f"Fake gateway read timed out. (read timeout={read_timeout})", request=request)
+        time.sleep(delay)
+
+        body = request.body.decode('utf-8') if isinstance(request.body, bytes) else request.body
+        status_code, payload = self.gateway.handle(
+            request.method, request.url[len(self.prefix):], request.headers, body)
+
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response._content = json.dumps(payload).encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API, so clients' pooled connections are reused.
+    protocol_version = 'HTTP/1.1'
+    gateway = None
+    prefix = ''
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def dispatch(self):
+        path = self.path.split('?', 1)[0]
+        if not path.startswith(self.prefix):
+            return self.respond(404, {'message': 'Not found'})
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        time.sleep(self.gateway.latency())
+        status_code, payload = self.gateway.handle(self.command, path[len(self.prefix):], self.headers, body)
+        self.respond(status_code, payload)
+
+    def respond(self, status_code, payload):
+        raw = json.dumps(payload).encode('utf-8')
+        try:
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out while we were "slow"; that is expected.
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def make_server(gateway, host='127.0.0.1', port=8090, prefix='/pg'):
+    """Build a threaded HTTP server serving `gateway` under `prefix`."""
+    handler = type('BoundFakeGatewayHandler', (FakeGatewayHandler,), {'gateway': gateway, 'prefix': prefix.rstrip('/')})
+    return ThreadingHTTPServer((host, port), handler)
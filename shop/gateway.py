@@ -0,0 +1,198 @@
+import base64
+import hashlib
+import hmac
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from project.metrics import get_metrics
+
+metrics = get_metrics('payment_gateway')
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class GatewayError(Exception):
+    """The gateway answered, but with an error."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class GatewayUnavailable(GatewayError):
+    """The gateway could not be reached, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast once the gateway has failed `failure_threshold` times in a row.
+
+    After `reset_timeout` seconds one trial call is let through (half-open);
+    its outcome closes the circuit again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class CashfreeClient:
+    """
+    Thin Cashfree PG client over a pooled `requests.Session`.
+
+    Every call has connect and read timeouts. Connection errors, timeouts and
+    5xx/429 answers are retried with full-jitter backoff, but only for reads
+    or requests carrying an idempotency key. Repeated failures open the
+    circuit breaker so callers fail fast while the gateway is degraded.
+    """
+
+    def __init__(self, base_url, client_id, client_secret, api_version,
+                 connect_timeout=3.05, read_timeout=10, max_retries=2, backoff=0.25,
+                 pool_size=20, breaker=None, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_version = api_version
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'x-client-id': client_id or '',
+            'x-client-secret': client_secret or '',
+            'x-api-version': api_version,
+            'Accept': 'application/json',
+        })
+
+    def request(self, method, path, operation, json=None, idempotency_key=None):
+        if not self.breaker.allow():
+            metrics.incr(f'{operation}.rejected')
+            raise GatewayUnavailable("Payment gateway circuit is open.")
+
+        headers = {'x-idempotency-key': idempotency_key} if idempotency_key else {}
+        retryable = method == 'GET' or idempotency_key is not None
+        attempts = self.max_retries + 1 if retryable else 1
+        for attempt in range(attempts):
+            if attempt:
+                metrics.incr(f'{operation}.retries')
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            try:
+                with metrics.timer(operation):
+                    response = self.session.request(
+                        method, f'{self.base_url}{path}', json=json, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = GatewayUnavailable(f"Payment gateway unreachable: {e}")
+                continue
+            except requests.RequestException as e:
+                error = GatewayUnavailable(f"Payment gateway request failed: {e}")
+                break
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                error = GatewayUnavailable(f"Payment gateway returned {response.status_code}.", response.status_code)
+                continue
+            self.breaker.record_success()
+            if response.status_code >= 400:
+                metrics.incr(f'{operation}.client_errors')
+                raise GatewayError(self.error_message(response), response.status_code)
+            metrics.incr(f'{operation}.ok')
+            try:
+                return response.json()
+            except ValueError:
+                raise GatewayError("Payment gateway returned invalid JSON.", response.status_code)
+
+        self.breaker.record_failure()
+        metrics.incr(f'{operation}.errors')
+        raise error
+
+    def error_message(self, response):
+        try:
+            return response.json().get('message', response.text)
+        except ValueError:
+            return response.text
+
+    def create_order(self, payload):
+        # The order id doubles as idempotency key, so a retried create is safe.
+        return self.request('POST', '/orders', 'create_order', json=payload,
+                            idempotency_key=str(payload['order_id']))
+
+    def fetch_payments(self, order_id):
+        return self.request('GET', f'/orders/{order_id}/payments', 'fetch_payments')
+
+    def verify_webhook_signature(self, signature, raw_body, timestamp):
+        """Check the HMAC-SHA256 signature Cashfree puts on webhooks."""
+        if not signature or not timestamp:
+            return False
+        digest = hmac.new(
+            (self.client_secret or '').encode('utf-8'),
+            f'{timestamp}{raw_body}'.encode('utf-8'),
+            hashlib.sha256,
+        ).digest()
+        return hmac.compare_digest(base64.b64encode(digest).decode('utf-8'), signature)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide gateway client, built from settings on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CashfreeClient(
+                base_url=settings.CASHFREE_BASE_URL,
+                client_id=settings.CASHFREE_CLIENT_ID,
+                client_secret=settings.CASHFREE_SECRET_KEY,
+                api_version=settings.CASHFREE_API_VERSION,
+                connect_timeout=settings.CASHFREE_CONNECT_TIMEOUT,
+                read_timeout=settings.CASHFREE_READ_TIMEOUT,
+                max_retries=settings.CASHFREE_MAX_RETRIES,
+            )
+            if settings.CASHFREE_BASE_URL.startswith('fake://'):
+                from shop.fake_gateway import FakeGateway, FakeGatewayAdapter
+                _client.session.mount(
+                    'fake://', FakeGatewayAdapter(FakeGateway.from_settings(), settings.CASHFREE_BASE_URL))
+        return _client
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.archive import archive_orders, archived_months, drop_month, export_month, months_ago, partition_name
+
+
+class Command(BaseCommand):
+    help = "Move old orders out of the hot tables and optionally export old archive months to files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=6,
+                            help="Months of orders, besides the current one, to keep in the hot tables.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--export-dir',
+                            help="Write archived months older than --export-after-months to gzipped JSON-lines files here.")
+        parser.add_argument('--export-after-months', type=int, default=24)
+        parser.add_argument('--drop-exported', action='store_true',
+                            help="Drop archive months once they are exported.")
+
+    def handle(self, *args, **options):
+        if options['keep_months'] < 0 or options['export_after_months'] < options['keep_months']:
+            raise CommandError("--keep-months must not be negative and --export-after-months must be at least --keep-months.")
+        if options['drop_exported'] and not options['export_dir']:
+            raise CommandError("--drop-exported needs --export-dir.")
+
+        cutoff = months_ago(options['keep_months'])
+        moved = archive_orders(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(f"Archived {moved} orders created before {cutoff:%Y-%m-%d}.")
+
+        if options['export_dir']:
+            for start in archived_months(months_ago(options['export_after_months'])):
+                path = export_month(start, options['export_dir'])
+                self.stdout.write(f"Exported {partition_name(start)} to {path}")
+                if options['drop_exported']:
+                    drop_month(start)
+                    self.stdout.write(f"Dropped {partition_name(start)}")
+
+        self.stdout.write(self.style.SUCCESS("Order archival finished."))
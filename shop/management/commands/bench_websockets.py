@@ -0,0 +1,215 @@
+import asyncio
+import json
+import time
+import tracemalloc
+
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from project.metrics import summarize
+from shop.models import Menu, Order
+from shop.notifications import order_group, seller_group
+from shop.routes.consumers import SellerConsumer
+
+
+class Command(BaseCommand):
+    help = ("Load-test the websocket consumers in-process: open N sockets, fire events "
+            "at a fixed rate and report connect rate, fan-out latency and memory per socket. "
+            "The simulated clients share the process with the app, so the numbers are an "
+            "upper bound on one daphne worker's load, not a network benchmark.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', choices=['seller', 'order'], default='seller')
+        parser.add_argument('--menu', help="Menu slug whose seller stream to follow (seller mode).")
+        parser.add_argument('--order', help="Order id to track (order mode).")
+        parser.add_argument('--connections', type=int, default=200)
+        parser.add_argument('--connect-concurrency', type=int, default=50)
+        parser.add_argument('--rate', type=float, default=20, help="Events per second.")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds to fire events for.")
+        parser.add_argument('--layer', choices=['auto', 'memory', 'redis'], default='auto',
+                            help="Channel layer to use; auto picks Redis when it answers.")
+        parser.add_argument('--window', type=float, help="Override SellerConsumer.coalesce_window.")
+        parser.add_argument('--output', help="Write the report as JSON to this file.")
+        parser.add_argument('--compare',
+                            help="Compare against a report saved with --output, e.g. the committed "
+                                 "benchmarks/websockets-baseline.json.")
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['rate'] <= 0 or options['duration'] <= 0:
+            raise CommandError("--connections, --rate and --duration must be positive.")
+        path, group, message_type, token = self.target(options)
+        layer_name = self.install_layer(options['layer'])
+        if options['window'] is not None:
+            SellerConsumer.coalesce_window = options['window']
+
+        from project.asgi import application
+
+        report = asyncio.run(self.run(application, path, group, message_type, token, options))
+        report['config'] = {
+            'consumer': options['consumer'],
+            'connections': options['connections'],
+            'rate': options['rate'],
+            'duration': options['duration'],
+            'layer': layer_name,
+            'coalesce_window': SellerConsumer.coalesce_window,
+        }
+
+        self.print_report(report)
+        if options['compare']:
+            self.print_comparison(report, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def target(self, options):
+        """Return (path, group, message type, access token) for the consumer under test."""
+        if options['consumer'] == 'seller':
+            menu = Menu.objects.select_related('outlet__outlet_manager').filter(menu_slug=options['menu']).first()
+            if menu is None or menu.outlet.outlet_manager is None:
+                raise CommandError("--menu must name a menu whose outlet has a manager.")
+            token = AccessToken.for_user(menu.outlet.outlet_manager)
+            return f'/ws/sellers/{menu.menu_slug}/', seller_group(menu.menu_slug), 'seller_notification', str(token)
+
+        order = Order.objects.select_related('user').filter(order_id=options['order']).first()
+        if order is None:
+            raise CommandError("--order must name an existing order.")
+        token = AccessToken.for_user(order.user)
+        return f'/ws/orders/{order.order_id}/', order_group(order.order_id), 'order_update', str(token)
+
+    def install_layer(self, choice):
+        if choice in ('auto', 'redis'):
+            try:
+                import redis
+                redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1).ping()
+            except Exception as e:
+                if choice == 'redis':
+                    raise CommandError(f"Redis is not reachable at {settings.REDIS_URL}: {e}")
+            else:
+                from channels_redis.core import RedisChannelLayer
+                channel_layers.set(DEFAULT_CHANNEL_LAYER, RedisChannelLayer(hosts=[settings.REDIS_URL]))
+                return 'redis'
+        channel_layers.set(DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer(capacity=1000))
+        return 'memory'
+
+    async def run(self, application, path, group, message_type, token, options):
+        connections = options['connections']
+        latencies = []
+        received = [0]
+
+        # Connect phase: connect rate and memory held per open socket.
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        semaphore = asyncio.Semaphore(options['connect_concurrency'])
+        failures = [0]
+
+        async def open_socket():
+            async with semaphore:
+                communicator = WebsocketCommunicator(application, path, subprotocols=['jwt', token])
+                connected, _ = await communicator.connect(timeout=10)
+                if not connected:
+                    failures[0] += 1
+                return communicator
+
+        started = time.perf_counter()
+        communicators = await asyncio.gather(*(open_socket() for _ in range(connections)))
+        connect_seconds = time.perf_counter() - started
+        await asyncio.sleep(0.5)  # let handshakes, snapshots and replays settle
+        per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / connections
+        tracemalloc.stop()
+
+        async def listen(communicator):
+            while True:
+                output = await communicator.output_queue.get()
+                if output['type'] != 'websocket.send':
+                    if output['type'] == 'websocket.close':
+                        return
+                    continue
+                now = time.perf_counter()
+                frame = json.loads(output['text'])
+                for event in frame.get('events', [frame]):
+                    sent = event.get('message', {}).get('sent')
+                    if sent is not None:
+                        latencies.append(now - sent)
+                        received[0] += 1
+
+        listeners = [asyncio.ensure_future(listen(communicator)) for communicator in communicators]
+
+        # Fire phase: events at a fixed rate, each stamped with its send time.
+        layer = channel_layers[DEFAULT_CHANNEL_LAYER]
+        total = int(options['rate'] * options['duration'])
+        interval = 1 / options['rate']
+        fire_started = time.perf_counter()
+        for seq in range(1, total + 1):
+            sent = time.perf_counter()
+            payload = json.dumps({'event': 'bench', 'order_id': f'bench-{seq}', 'sent': sent})
+            event = {
+                'seq': seq,
+                'order_id': f'bench-{seq}',
+                'has_lines': False,
+                'text': f'{{"seq":{seq},"message":{payload}}}',
+            }
+            if message_type == 'seller_notification':
+                # Seller groups get events in batches, as notify_sellers() sends them.
+                event = {'events': [event]}
+            await layer.group_send(group, {'type': message_type, **event})
+            delay = fire_started + seq * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        expected = total * (connections - failures[0])
+        deadline = time.perf_counter() + 10
+        while received[0] < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+        for listener in listeners:
+            listener.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+        for communicator in communicators:
+            await communicator.disconnect()
+
+        latencies.sort()
+        return {
+            'connect': {
+                'opened': connections - failures[0],
+                'failed': failures[0],
+                'seconds': connect_seconds,
+                'per_second': connections / connect_seconds if connect_seconds else None,
+            },
+            'memory_per_connection_bytes': per_connection,
+            'events': {'sent': total, 'expected_deliveries': expected, 'delivered': received[0]},
+            'latency': summarize(latencies) if latencies else None,
+        }
+
+    def print_report(self, report):
+        connect, events, latency = report['connect'], report['events'], report['latency']
+        self.stdout.write(
+            f"Connected {connect['opened']} sockets ({connect['failed']} failed) in {connect['seconds']:.2f}s "
+            f"= {connect['per_second']:.0f}/s")
+        self.stdout.write(f"Memory per connection: {report['memory_per_connection_bytes'] / 1024:.1f} KiB")
+        self.stdout.write(f"Delivered {events['delivered']}/{events['expected_deliveries']} event copies")
+        if latency:
+            self.stdout.write(
+                "Fan-out latency: " + ', '.join(f"{key} {latency[key] * 1000:.1f}ms" for key in ('p50', 'p95', 'p99', 'max')))
+
+    def print_comparison(self, report, baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        rows = [
+            ('connect/s', report['connect']['per_second'], baseline['connect']['per_second']),
+            ('bytes/connection', report['memory_per_connection_bytes'], baseline['memory_per_connection_bytes']),
+        ]
+        for key in ('p50', 'p95', 'p99'):
+            if report['latency'] and baseline.get('latency'):
+                rows.append((f'latency {key}', report['latency'][key], baseline['latency'][key]))
+        self.stdout.write(f"Compared with {baseline_path}:")
+        if baseline.get('config') != report['config']:
+            self.stdout.write(self.style.WARNING(
+                f"  The baseline was run with {baseline.get('config')}; the numbers are not like for like."))
+        for name, current, previous in rows:
+            change = (current - previous) / previous * 100 if previous else 0
+            self.stdout.write(f"  {name}: {previous:.4g} -> {current:.4g} ({change:+.1f}%)")
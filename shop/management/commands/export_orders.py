@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from shop.exports import EXPORT_FORMATS, export_rows, stream_export
+from shop.models import Outlet
+from shop.pagination import parse_bound
+
+
+class Command(BaseCommand):
+    help = "Stream an outlet's order lines to a CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('outlet', type=int, help="Outlet id.")
+        parser.add_argument('--from', dest='start', help="Start date or datetime (inclusive).")
+        parser.add_argument('--to', dest='end', help="End date (inclusive) or datetime (exclusive).")
+        parser.add_argument('--format', dest='file_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', default='-', help="File to write to; '-' for stdout.")
+
+    def handle(self, *args, **options):
+        outlet = Outlet.objects.filter(id=options['outlet']).first()
+        if outlet is None:
+            raise CommandError(f"Outlet {options['outlet']} does not exist.")
+        try:
+            start = parse_bound(options['start'], 'from')
+            end = parse_bound(options['end'], 'to')
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        rows = export_rows(outlet, start, end)
+        handle = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        try:
+            for chunk in stream_export(rows, options['file_format']):
+                handle.write(chunk)
+        finally:
+            if handle is not sys.stdout:
+                handle.close()
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.webhooks import process_due_events
+
+
+class Command(BaseCommand):
+    help = "Process the payment webhook inbox. Runs until stopped unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process the due events once and exit.")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to sleep when the inbox is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            seen = process_due_events(options['batch_size'])
+            if options['once']:
+                self.stdout.write(f"Processed {seen} webhook events.")
+                return
+            if seen < options['batch_size']:
+                time.sleep(options['interval'])
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from shop.models import Outlet
+from shop.rollups import rebuild_outlet_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the outlet sales rollups from the raw order tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outlet', type=int, action='append', dest='outlets',
+                            help="Outlet id to rebuild; repeat for several. Defaults to all outlets.")
+        parser.add_argument('--from', dest='start', help="First local date to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', help="Last local date to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        start = self.parse_day(options['start'], '--from')
+        end = self.parse_day(options['end'], '--to')
+
+        outlets = Outlet.objects.all()
+        if options['outlets']:
+            outlets = outlets.filter(id__in=options['outlets'])
+
+        for outlet in outlets.iterator():
+            count = rebuild_outlet_rollups(outlet, start, end)
+            self.stdout.write(f"{outlet.name}: {count} orders rolled up")
+        self.stdout.write(self.style.SUCCESS("Sales rollups rebuilt."))
+
+    def parse_day(self, value, name):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"{name} must be a date in YYYY-MM-DD format.")
+        return day
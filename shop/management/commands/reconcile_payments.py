@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.reconcile import reconcile_payments
+
+
+class Command(BaseCommand):
+    help = "Resolve orders stuck in an open payment state by asking the payment gateway."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent gateway requests.")
+        parser.add_argument('--rate', type=float, default=20, help="Gateway requests per second, across workers.")
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--older-than', type=int, default=15,
+                            help="Only look at orders created at least this many minutes ago.")
+        parser.add_argument('--expire-after', type=int, default=24,
+                            help="Mark orders still unpaid this many hours after checkout as expired.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['rate'] <= 0 or options['batch_size'] < 1 or options['expire_after'] < 1:
+            raise CommandError("--workers, --rate, --batch-size and --expire-after must be positive.")
+
+        stats = reconcile_payments(
+            workers=options['workers'],
+            rate=options['rate'],
+            batch_size=options['batch_size'],
+            older_than=datetime.timedelta(minutes=options['older_than']),
+            expire_after=datetime.timedelta(hours=options['expire_after']),
+            progress=lambda stats: self.stdout.write(
+                f"... {stats.checked} checked, {stats.checked / stats.elapsed:.1f} orders/s"),
+        )
+        self.stdout.write(stats.report())
+        self.stdout.write(self.style.SUCCESS("Payment reconciliation finished."))
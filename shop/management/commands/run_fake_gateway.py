@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.fake_gateway import FakeGateway, make_server
+
+
+class Command(BaseCommand):
+    help = ("Serve a fake Cashfree PG API for load and integration tests. "
+            "Point CASHFREE_BASE_URL at http://<host>:<port>/pg to use it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument('--latency-ms', type=float, default=settings.FAKE_GATEWAY_LATENCY_MS)
+        parser.add_argument('--jitter-ms', type=float, default=settings.FAKE_GATEWAY_JITTER_MS)
+        parser.add_argument('--failure-rate', type=float, default=settings.FAKE_GATEWAY_FAILURE_RATE,
+                            help="Fraction of API calls answered with a 503.")
+        parser.add_argument('--pay-after', type=float, default=settings.FAKE_GATEWAY_PAY_AFTER,
+                            help="Seconds after creation to pay each order automatically. "
+                                 "Without it orders are paid via POST /pg/orders/<id>/pay.")
+        parser.add_argument('--success-rate', type=float, default=settings.FAKE_GATEWAY_SUCCESS_RATE,
+                            help="Fraction of automatic payments that succeed.")
+        parser.add_argument('--webhook-url', default=settings.FAKE_GATEWAY_WEBHOOK_URL,
+                            help="Where to send payment webhooks instead of the order's notify_url.")
+
+    def handle(self, *args, **options):
+        gateway = FakeGateway.from_settings(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            failure_rate=options['failure_rate'],
+            pay_after=options['pay_after'],
+            success_rate=options['success_rate'],
+            webhook_url=options['webhook_url'],
+        )
+        server = make_server(gateway, options['host'], options['port'])
+        self.stdout.write(f"Fake gateway listening on http://{options['host']}:{options['port']}/pg")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
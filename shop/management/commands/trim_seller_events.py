@@ -0,0 +1,22 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from shop.seller_events import KEEP_PER_OUTLET, MAX_AGE, trim_seller_events
+
+
+class Command(BaseCommand):
+    help = "Trim the seller event log that reconnecting dashboards resume from."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=KEEP_PER_OUTLET,
+                            help="Newest events to keep per outlet.")
+        parser.add_argument('--max-age-hours', type=float, default=MAX_AGE.total_seconds() / 3600,
+                            help="Drop events older than this many hours.")
+
+    def handle(self, *args, **options):
+        removed = trim_seller_events(
+            keep=options['keep'],
+            max_age=datetime.timedelta(hours=options['max_age_hours']),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} seller events."))
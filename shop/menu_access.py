@@ -0,0 +1,41 @@
+from django.core.cache import cache
+
+ACCESS_TTL = 60 * 60
+
+
+def access_key(menu_slug):
+    return f'menu_access:{menu_slug}'
+
+
+def load_menu_access(menu_slug):
+    from shop.models import Menu
+
+    row = Menu.objects.filter(menu_slug=menu_slug).values_list('outlet_id', 'outlet__outlet_manager_id').first()
+    if row is None:
+        return None
+    return {'outlet_id': row[0], 'manager_id': row[1]}
+
+
+def get_menu_access(menu_slug):
+    """
+    Return {'outlet_id', 'manager_id'} for a menu, or None if it does not
+    exist, from the shared cache when possible. Outlet and Menu saves
+    invalidate the entry.
+    """
+    access = cache.get(access_key(menu_slug))
+    if access is None:
+        access = load_menu_access(menu_slug)
+        if access is not None:
+            cache.set(access_key(menu_slug), access, ACCESS_TTL)
+    return access
+
+
+def invalidate_menu_access(*menu_slugs):
+    cache.delete_many([access_key(menu_slug) for menu_slug in menu_slugs])
+
+
+def can_follow_menu(user, access):
+    """Only the outlet's manager (or staff) may follow its seller stream."""
+    if access is None or not user or not user.is_authenticated:
+        return False
+    return user.is_staff or access['manager_id'] == user.id
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.4 on 2026-10-19 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_fooditem_in_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['outlet', 'created_at', 'order_id'], name='order_outlet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'order_id'], name='order_user_created_idx'),
+        ),
+    ]
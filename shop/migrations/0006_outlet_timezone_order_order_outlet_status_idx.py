@@ -0,0 +1,22 @@
+# Generated by Django 4.2.4 on 2026-10-19 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_order_order_outlet_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outlet',
+            name='timezone',
+            field=models.CharField(default='Asia/Kolkata', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['outlet', 'status', 'created_at'], name='order_outlet_status_idx'),
+        ),
+    ]
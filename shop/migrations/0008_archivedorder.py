@@ -0,0 +1,83 @@
+# Generated by Django 4.2.4 on 2026-10-19 08:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+PARTITIONED_TABLE_SQL = [
+    """
+    CREATE TABLE "shop_archivedorder" (
+        "order_id" varchar(500) NOT NULL,
+        "payment_id" varchar(500) NULL,
+        "transaction_id" varchar(500) NULL,
+        "table_name" varchar(100) NULL,
+        "cooking_instructions" text NULL,
+        "order_type" varchar(10) NOT NULL,
+        "total" numeric(10, 2) NOT NULL,
+        "status" varchar(10) NOT NULL,
+        "payment_status" varchar(30) NOT NULL,
+        "transaction_status" varchar(10) NOT NULL,
+        "items" jsonb NOT NULL,
+        "created_at" timestamp with time zone NOT NULL,
+        "updated_at" timestamp with time zone NOT NULL,
+        "archived_at" timestamp with time zone NOT NULL,
+        "outlet_id" bigint NOT NULL,
+        "user_id" integer NOT NULL,
+        PRIMARY KEY ("order_id", "created_at")
+    ) PARTITION BY RANGE ("created_at")
+    """,
+    'CREATE INDEX "archived_order_outlet_idx" ON "shop_archivedorder" ("outlet_id", "created_at")',
+    'CREATE INDEX "archived_order_user_idx" ON "shop_archivedorder" ("user_id", "created_at")',
+]
+
+
+def partition_archive_table(apps, schema_editor):
+    # On PostgreSQL, replace the plain table with one range-partitioned by
+    # created_at month. Monthly partitions are created on demand by
+    # shop.archive. Other databases keep the plain table.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # delete_model() also drops the CreateModel indexes still waiting in
+    # deferred_sql, which would otherwise be created on the new table after
+    # this function and clash with the ones below.
+    schema_editor.delete_model(apps.get_model('shop', 'ArchivedOrder'))
+    for statement in PARTITIONED_TABLE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shop', '0007_order_rolled_up_outletsalesrollup_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('order_id', models.CharField(max_length=500, primary_key=True, serialize=False)),
+                ('payment_id', models.CharField(blank=True, max_length=500, null=True)),
+                ('transaction_id', models.CharField(blank=True, max_length=500, null=True)),
+                ('table_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('cooking_instructions', models.TextField(blank=True, null=True)),
+                ('order_type', models.CharField(max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(max_length=10)),
+                ('payment_status', models.CharField(max_length=30)),
+                ('transaction_status', models.CharField(max_length=10)),
+                ('items', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('outlet', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_orders', to='shop.outlet')),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['outlet', 'created_at'], name='archived_order_outlet_idx'), models.Index(fields=['user', 'created_at'], name='archived_order_user_idx')],
+            },
+        ),
+        migrations.RunPython(partition_archive_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.4 on 2026-10-19 08:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_archivedorder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='prep_estimate',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='promised_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='KitchenQueue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stations', models.PositiveSmallIntegerField(default=1)),
+                ('open_orders', models.PositiveIntegerField(default=0)),
+                ('busy_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('outlet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='kitchen_queue', to='shop.outlet')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.4 on 2026-10-19 08:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_order_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('payload', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('outlet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_events', to='shop.outlet')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['outlet', 'id'], name='seller_event_outlet_idx')],
+            },
+        ),
+    ]
@@ -1,7 +1,12 @@
 from django.db import models
 from authentication.models import CustomUser
+from shortener.codes import create_short_urls
 from shortener.models import ShortenedURL
+from shop.menu_access import invalidate_menu_access
 from django.conf import settings
+from django.utils import timezone
+from zoneinfo import ZoneInfo
+import datetime
 import uuid
 import re
 
@@ -41,6 +46,7 @@ class Outlet(models.Model):
     whatsapp = models.CharField(max_length=15, null=True, blank=True)
 
     slug = models.SlugField(max_length=100, unique=True, blank=True, null=True)
+    timezone = models.CharField(max_length=50, default='Asia/Kolkata')
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -56,6 +62,21 @@ class Outlet(models.Model):
         outlet_name = re.sub(r'[^a-zA-Z0-9]', '', self.name.lower().replace(' ', '-'))
         self.slug = f"{shop_name}-{outlet_name}"
         super(Outlet, self).save(*args, **kwargs)
+        # The manager may have changed; drop cached websocket access to our menus.
+        invalidate_menu_access(*self.menu_set.values_list('menu_slug', flat=True))
+
+    def delete(self, *args, **kwargs):
+        invalidate_menu_access(*self.menu_set.values_list('menu_slug', flat=True))
+        return super().delete(*args, **kwargs)
+
+    def get_day_bounds(self, day=None):
+        """Return the half-open [start, end) UTC range of a local business day."""
+        tz = ZoneInfo(self.timezone)
+        if day is None:
+            day = timezone.now().astimezone(tz).date()
+        start = datetime.datetime.combine(day, datetime.time.min, tzinfo=tz)
+        end = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+        return start, end
     
     class Meta:
         ordering = ['name']
@@ -104,6 +125,14 @@ class Menu(models.Model):
     def __str__(self):
         return self.menu_slug
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_menu_access(self.menu_slug)
+
+    def delete(self, *args, **kwargs):
+        invalidate_menu_access(self.menu_slug)
+        return super().delete(*args, **kwargs)
+
     class Meta:
         ordering = ['created_at']
 
@@ -336,12 +365,27 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     prep_start_time = models.DateTimeField(blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Kitchen ETA, maintained by shop.eta.
+    prep_estimate = models.PositiveIntegerField(blank=True, null=True)
+    promised_at = models.DateTimeField(blank=True, null=True)
+
+    # Set once the order has been counted in the sales rollups.
+    rolled_up = models.BooleanField(default=False)
+
+    # Bumped on every status or payment change, so clients can drop stale events.
+    version = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return self.order_id
         
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['outlet', 'created_at', 'order_id'], name='order_outlet_created_idx'),
+            models.Index(fields=['user', 'created_at', 'order_id'], name='order_user_created_idx'),
+            models.Index(fields=['outlet', 'status', 'created_at'], name='order_outlet_status_idx'),
+        ]
         
     def get_total_price(self):
         items = OrderItem.objects.filter(order=self)
@@ -372,6 +416,148 @@ class OrderItem(models.Model):
             price += addon.price
         return float(price * self.quantity)
 
+class WebhookEvent(models.Model):
+    """
+    Inbox of verified payment gateway webhooks, stored raw on receipt and
+    processed in the background by the `process_webhooks` command.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+        ('dead', 'Dead')
+    ]
+    dedupe_key = models.CharField(max_length=64, unique=True)
+    event_type = models.CharField(max_length=100, blank=True)
+    order_id = models.CharField(max_length=500, blank=True)
+    body = models.TextField()
+    headers = models.JSONField(default=dict)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.event_type} for {self.order_id} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_due_idx'),
+            models.Index(fields=['order_id', 'id'], name='webhook_order_idx'),
+        ]
+
+class SellerEvent(models.Model):
+    """
+    Per-outlet log of the events pushed to seller dashboards. The id is the
+    sequence number a reconnecting tablet resumes from; old rows are trimmed
+    by the `trim_seller_events` command.
+    """
+    id = models.BigAutoField(primary_key=True)
+    outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, related_name='seller_events')
+    payload = models.TextField()  # the encoded envelope, sent verbatim
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.id} for outlet {self.outlet_id}"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['outlet', 'id'], name='seller_event_outlet_idx'),
+        ]
+
+class KitchenQueue(models.Model):
+    """
+    Running state of an outlet's kitchen, updated by shop.eta as orders enter
+    and leave it so that an ETA never needs a scan of the open orders.
+    """
+    outlet = models.OneToOneField(Outlet, on_delete=models.CASCADE, related_name='kitchen_queue')
+    stations = models.PositiveSmallIntegerField(default=1)  # orders the kitchen can cook in parallel
+    open_orders = models.PositiveIntegerField(default=0)
+    busy_until = models.DateTimeField(blank=True, null=True)  # when the queued work is expected to clear
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.outlet.name} - {self.open_orders} open"
+
+class ArchivedOrder(models.Model):
+    """
+    Cold copy of an order moved out of the hot Order/OrderItem tables by the
+    `archive_orders` command. On PostgreSQL the table is range-partitioned by
+    created_at month, see shop.archive.
+
+    A partitioned table's primary key has to include the partition key, so
+    on PostgreSQL the real key is (order_id, created_at). Django 4.2 cannot
+    declare a composite key, so the model keeps order_id as its pk: lookups
+    by pk still work, but the database only guarantees order_id is unique
+    within a created_at, which holds because rows are copied from Order. The
+    single-column order_id index Django assumes for a CharField pk does not
+    exist there either. SQLite keeps the plain table with order_id as key.
+    """
+    order_id = models.CharField(max_length=500, primary_key=True)
+    payment_id = models.CharField(max_length=500, blank=True, null=True)
+    transaction_id = models.CharField(max_length=500, blank=True, null=True)
+
+    # Covered by the (user, created_at) and (outlet, created_at) indexes.
+    user = models.ForeignKey(CustomUser, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='archived_orders')
+    outlet = models.ForeignKey(Outlet, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='archived_orders')
+    table_name = models.CharField(max_length=100, blank=True, null=True)
+    cooking_instructions = models.TextField(blank=True, null=True)
+    order_type = models.CharField(max_length=10)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+
+    status = models.CharField(max_length=10)
+    payment_status = models.CharField(max_length=30)
+    transaction_status = models.CharField(max_length=10)
+    items = models.JSONField(default=list)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.order_id
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['outlet', 'created_at'], name='archived_order_outlet_idx'),
+            models.Index(fields=['user', 'created_at'], name='archived_order_user_idx'),
+        ]
+
+class OutletSalesRollup(models.Model):
+    outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, related_name='sales_rollups')
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.outlet.name} - {self.date} {self.hour:02d}:00"
+
+    class Meta:
+        ordering = ['date', 'hour']
+        unique_together = ('outlet', 'date', 'hour')
+
+class OutletItemSalesRollup(models.Model):
+    outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, related_name='item_sales_rollups')
+    food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE, related_name='sales_rollups')
+    date = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.food_item.name} - {self.date}"
+
+    class Meta:
+        ordering = ['date']
+        unique_together = ('outlet', 'food_item', 'date')
+
 class Table(models.Model):
     table_id = models.CharField(max_length=100, unique=True, default=uuid.uuid4)
     name = models.CharField(max_length=100)
@@ -393,7 +579,27 @@ class Table(models.Model):
         self.url = short_url
         self.save()
         return f"https://api.tacoza.co/{short_url.short_code}"
-        
+
+    @staticmethod
+    def assign_urls(tables):
+        """
+        Give every table without a short URL one, reserving all the codes at
+        once and creating the URLs with a single INSERT.
+        """
+        missing = [table for table in tables if table.url_id is None]
+        if not missing:
+            return
+        menu_slugs = dict(
+            Menu.objects.filter(outlet_id__in={table.outlet_id for table in missing}).values_list('outlet_id', 'menu_slug')
+        )
+        missing = [table for table in missing if table.outlet_id in menu_slugs]
+        urls = create_short_urls([
+            f"https://app.tacoza.co/{menu_slugs[table.outlet_id]}/{table.table_id}" for table in missing
+        ])
+        for table, url in zip(missing, urls):
+            table.url = url
+        Table.objects.bulk_update(missing, ['url'])
+
     class Meta:
         ordering = ['name']
 
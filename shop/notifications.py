@@ -0,0 +1,130 @@
+import json
+import logging
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from shop.models import Menu
+from shop.seller_events import append_event, frame
+
+logger = logging.getLogger(__name__)
+
+
+def send_to_group(group, message):
+    """Send a message to a channel layer group without failing the caller."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group, message)
+    except Exception:
+        logger.exception("Failed to publish to %s", group)
+
+
+def order_group(order_id):
+    return f'order_{order_id}'
+
+
+def seller_group(menu_slug):
+    return f'seller_{menu_slug}'
+
+
+def encode(message):
+    return json.dumps({'message': message}, separators=(',', ':'))
+
+
+def order_state(order, event):
+    """What a customer's tracking channel is told about their order."""
+    return {
+        'event': event,
+        'order_id': str(order.order_id),
+        'status': order.status,
+        'payment_status': order.payment_status,
+        'version': order.version,
+        'prep_start_time': order.prep_start_time.isoformat() if order.prep_start_time else None,
+        'promised_at': order.promised_at.isoformat() if order.promised_at else None,
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+    }
+
+
+def notify_order(order, event):
+    """Push the current state of an order to the customer's tracking group."""
+    send_to_group(order_group(order.order_id), {'type': 'order_update', 'text': encode(order_state(order, event))})
+
+
+def order_lines(order):
+    """Just enough of each line for a kitchen ticket."""
+    items = order.items.select_related('food_item', 'variant').prefetch_related('addons')
+    return [
+        {
+            'item': item.food_item.name,
+            'variant': item.variant.name if item.variant else None,
+            'addons': [addon.name for addon in item.addons.all()],
+            'quantity': item.quantity,
+        }
+        for item in items
+    ]
+
+
+def seller_envelope(order, event, lines=False):
+    """
+    The compact event seller dashboards patch their state with. Only new
+    orders carry their lines; anything else is fetched from order/<id>/.
+    """
+    envelope = {
+        'event': event,
+        'order_id': str(order.order_id),
+        'status': order.status,
+        'payment_status': order.payment_status,
+        'version': order.version,
+        'order_type': order.order_type,
+        'table': order.table.name if order.table_id else None,
+        'total': float(order.total),
+        'promised_at': order.promised_at.isoformat() if order.promised_at else None,
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+    }
+    if lines:
+        envelope['lines'] = order_lines(order)
+    return envelope
+
+
+def notify_seller(order, event, lines=False):
+    """Log a seller event for an order and push it to its outlet's dashboards."""
+    notify_sellers([(order, event, lines)])
+
+
+def notify_sellers(changes):
+    """
+    Log a seller event for every (order, event, lines) in `changes` and push
+    them to the outlets' dashboards, one group message per menu however many
+    events it carries.
+
+    Each envelope is encoded once here; every SellerConsumer sends the frames
+    as-is instead of re-serializing them per connected tablet. A log entry's
+    id is its frame's sequence number, which tablets resume from.
+    """
+    by_outlet = defaultdict(list)
+    for order, event, lines in changes:
+        payload = json.dumps(seller_envelope(order, event, lines), separators=(',', ':'))
+        try:
+            seq = append_event(order.outlet_id, payload)
+        except Exception:
+            logger.exception("Failed to log seller event for order %s", order.order_id)
+            continue
+        by_outlet[order.outlet_id].append({
+            'seq': seq,
+            'order_id': str(order.order_id),
+            'has_lines': lines,
+            'text': frame(seq, payload),
+        })
+    menus = Menu.objects.filter(outlet_id__in=by_outlet).values_list('outlet_id', 'menu_slug')
+    for outlet_id, menu_slug in menus:
+        send_to_group(seller_group(menu_slug), {'type': 'seller_notification', 'events': by_outlet[outlet_id]})
+
+
+def notify_payments(orders):
+    """Tell customers about payment changes, and the kitchen about newly paid orders."""
+    for order in orders:
+        notify_order(order, 'payment')
+    notify_sellers([(order, 'paid', True) for order in orders if order.payment_status == 'success'])
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from shop.models import Order
+from shop.eta import start_order, release_order
+from shop.notifications import notify_order, notify_seller
+from shop.rollups import record_order_sale, remove_order_sale
+
+# Allowed moves of Order.status; completed and cancelled are terminal.
+ORDER_TRANSITIONS = {
+    'pending': ('processing', 'cancelled'),
+    'processing': ('completed', 'cancelled'),
+    'completed': (),
+    'cancelled': (),
+}
+
+
+class InvalidTransition(Exception):
+    """The requested status cannot be reached from the order's current status."""
+
+
+class TransitionConflict(Exception):
+    """The order's status changed underneath us, e.g. another tablet moved it first."""
+
+
+def transition_order(order, new_status):
+    """
+    Move an order to `new_status` with a single compare-and-set UPDATE.
+
+    The row is only touched if its status still matches the one we loaded,
+    so two devices racing on the same order cannot both win.
+    """
+    expected = order.status
+    if new_status not in ORDER_TRANSITIONS.get(expected, ()):
+        raise InvalidTransition(f"Cannot move an order from {expected} to {new_status}.")
+
+    now = timezone.now()
+    changes = {'status': new_status, 'updated_at': now}
+    if new_status == 'processing':
+        changes['prep_start_time'] = now
+
+    updated = Order.objects.filter(pk=order.pk, status=expected).update(version=F('version') + 1, **changes)
+    if not updated:
+        raise TransitionConflict(f"Order {order.pk} is no longer {expected}.")
+
+    for field, value in changes.items():
+        setattr(order, field, value)
+    order.refresh_from_db(fields=['version'])
+
+    if new_status == 'processing':
+        start_order(order)
+    else:
+        release_order(order)
+
+    if new_status == 'completed':
+        record_order_sale(order)
+    elif new_status == 'cancelled':
+        remove_order_sale(order)
+    transaction.on_commit(lambda: notify_order(order, 'status'))
+    transaction.on_commit(lambda: notify_seller(order, 'status'))
+    return order
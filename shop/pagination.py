@@ -0,0 +1,114 @@
+import base64
+import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def parse_bound(value, name):
+    """Parse a date or datetime query parameter into an aware datetime."""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: 'Expected an ISO date or datetime.'})
+        parsed = datetime.datetime.combine(day, datetime.time.min)
+        if name == 'to':
+            # A bare end date includes the whole day.
+            parsed += datetime.timedelta(days=1)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class OrderCursorPagination(BasePagination):
+    """
+    Keyset pagination over (created_at, order_id), newest first.
+
+    The cursor carries the position of the last order on the page, so every
+    page is an index range scan on (outlet|user, created_at, order_id) no
+    matter how deep into the history the client is.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-created_at', '-order_id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = self.filter_queryset(queryset, request)
+        position = self.decode_cursor(request)
+        if position:
+            created_at, order_id = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) |
+                Q(created_at=created_at, order_id__lt=order_id)
+            )
+
+        # Fetch one extra row to know whether there is a next page.
+        results = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.last = results[-1] if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def filter_queryset(self, queryset, request):
+        """Apply the status and date range filters, which ride the same index."""
+        order_status = request.query_params.get('status')
+        if order_status:
+            queryset = queryset.filter(status=order_status)
+
+        start = parse_bound(request.query_params.get('from'), 'from')
+        end = parse_bound(request.query_params.get('to'), 'to')
+        if start:
+            queryset = queryset.filter(created_at__gte=start)
+        if end:
+            queryset = queryset.filter(created_at__lt=end)
+        return queryset
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8')
+            created_at, order_id = decoded.split('|', 1)
+            created_at = parse_datetime(created_at)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            created_at = None
+        if created_at is None:
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
+        return created_at, order_id
+
+    def encode_cursor(self, order):
+        raw = f"{order.created_at.isoformat()}|{order.order_id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
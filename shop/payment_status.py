@@ -0,0 +1,156 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from shop.eta import enqueue_order
+from shop.gateway import GatewayError
+from shop.models import Order
+from shop.notifications import notify_payments
+from shop.rollups import record_order_sale
+
+CACHE_TTL = 5  # seconds a gateway answer is trusted for a non-terminal order
+LOCK_TTL = 10
+WAIT_INTERVAL = 0.1
+WAIT_ATTEMPTS = 20
+TERMINAL_STATUSES = ('success', 'failed')
+
+# Gateway payment statuses mapped onto Order.transaction_status.
+GATEWAY_STATUSES = {
+    'SUCCESS': 'success',
+    'PENDING': 'pending',
+    'NOT_ATTEMPTED': 'pending',
+    'FAILED': 'failed',
+    'USER_DROPPED': 'failed',
+    'CANCELLED': 'failed',
+    'VOID': 'failed',
+}
+
+
+# The payment states each result may replace. A success is final, and still
+# wins over a failure or expiry (the customer paid on a later attempt); a
+# late failure or pending result never undoes anything. Reconciliation
+# expires checkouts abandoned without a payment.
+REPLACEABLE_STATUSES = {
+    'success': ('active', 'pending', 'failed', 'expired'),
+    'failed': ('active', 'pending'),
+    'expired': ('active', 'pending'),
+    'pending': ('active',),
+}
+# transaction_status has no 'expired'; to pollers an expired order is failed.
+TRANSACTION_STATUSES = {'expired': 'failed'}
+
+
+def cache_key(order_id):
+    return f'payment_status:{order_id}'
+
+
+def payment_state(order):
+    return {
+        'order_id': str(order.order_id),
+        'payment_status': order.payment_status,
+        'transaction_status': order.transaction_status,
+    }
+
+
+def remember_payment_state(order):
+    """Cache the order's current payment state, e.g. after a webhook moved it."""
+    cache.set(cache_key(order.order_id), payment_state(order), CACHE_TTL)
+
+
+def payment_statuses(payments):
+    """Return the statuses of the gateway's payment attempts, oldest first."""
+    payments = sorted(payments, key=lambda payment: payment.get('payment_time') or '')
+    return [payment.get('payment_status') for payment in payments]
+
+
+def gateway_status(payment_statuses):
+    """Reduce the gateway's payment attempts, oldest first, to a transaction status."""
+    if 'SUCCESS' in payment_statuses:
+        return 'success'
+    if not payment_statuses:
+        return 'pending'
+    return GATEWAY_STATUSES.get(payment_statuses[-1], 'pending')
+
+
+def apply_payment_statuses(order_ids, new_status):
+    """
+    Move the given orders to a payment result and return the orders that
+    changed; orders whose current state the result may not replace (see
+    REPLACEABLE_STATUSES) are left alone. Every payment path, webhooks,
+    status polls and reconciliation, goes through here.
+
+    The changing rows are locked before the UPDATE, so only the orders this
+    call moved get queued, rolled up and notified.
+    """
+    with transaction.atomic():
+        claimed = Order.objects.filter(order_id__in=order_ids, payment_status__in=REPLACEABLE_STATUSES[new_status])
+        claimed_ids = list(claimed.select_for_update().values_list('order_id', flat=True))
+        if not claimed_ids:
+            return []
+        Order.objects.filter(order_id__in=claimed_ids).update(
+            payment_status=new_status, transaction_status=TRANSACTION_STATUSES.get(new_status, new_status),
+            version=F('version') + 1, updated_at=timezone.now())
+        orders = list(Order.objects.select_related('outlet', 'table').filter(order_id__in=claimed_ids))
+        for order in orders:
+            if new_status == 'success':
+                # The kitchen only starts counting an order once it is paid.
+                enqueue_order(order)
+                record_order_sale(order)
+            transaction.on_commit(lambda order=order: remember_payment_state(order))
+        # Customers get the new state; the kitchen gets the paid orders' tickets.
+        transaction.on_commit(lambda: notify_payments(orders))
+    return orders
+
+
+def apply_payment_status(order_id, new_status):
+    """Apply a payment result to one order; returns the order if it changed, else None."""
+    changed = apply_payment_statuses([order_id], new_status)
+    return changed[0] if changed else None
+
+
+def refresh_payment_state(order, fetch_payments):
+    """Ask the gateway about a non-terminal order and store what it says."""
+    new_status = gateway_status(fetch_payments(order.order_id))
+    if new_status != order.transaction_status:
+        # A terminal state a webhook wrote meanwhile is never overwritten.
+        apply_payment_status(order.order_id, new_status)
+        order.refresh_from_db(fields=['payment_status', 'transaction_status', 'version'])
+    remember_payment_state(order)
+    return payment_state(order)
+
+
+def get_payment_status(order, fetch_payments):
+    """
+    Serve an order's payment state from the database and cache, calling the
+    gateway only when the cached state is stale and not yet terminal.
+
+    Concurrent pollers for the same order share one gateway call: the first
+    takes a short cache lock and refreshes, the rest wait for its result.
+    """
+    if order.transaction_status in TERMINAL_STATUSES:
+        return payment_state(order)
+
+    key = cache_key(order.order_id)
+    cached = cache.get(key)
+    if cached:
+        return cached
+
+    lock = f'{key}:refresh'
+    if cache.add(lock, 1, LOCK_TTL):
+        try:
+            return refresh_payment_state(order, fetch_payments)
+        except GatewayError:
+            # Fall back to what we last knew while the gateway is struggling.
+            return payment_state(order)
+        finally:
+            cache.delete(lock)
+
+    for _ in range(WAIT_ATTEMPTS):
+        time.sleep(WAIT_INTERVAL)
+        cached = cache.get(key)
+        if cached:
+            return cached
+    return payment_state(order)
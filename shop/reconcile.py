@@ -0,0 +1,139 @@
+import datetime
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.utils import timezone
+
+from shop.gateway import GatewayError, get_gateway
+from shop.models import Order
+from shop.payment_status import apply_payment_statuses, gateway_status, payment_statuses
+
+# Payment states an order can be stuck in when its webhook never arrived.
+OPEN_PAYMENT_STATUSES = ('active', 'pending')
+RESOLVED_STATUSES = ('success', 'failed')
+
+
+class RateLimiter:
+    """Token bucket shared by the worker threads: `rate` calls per second, bursting to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ReconcileStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.checked = 0
+        self.unchanged = 0
+        self.errors = 0
+        self.updated = defaultdict(int)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def report(self):
+        elapsed = self.elapsed
+        lines = [
+            f"Checked {self.checked} orders in {elapsed:.1f}s "
+            f"({self.checked / elapsed if elapsed else 0:.1f} orders/s).",
+            "Updated: " + (', '.join(f"{s}={n}" for s, n in sorted(self.updated.items())) or 'none'),
+            f"Unchanged: {self.unchanged}, gateway errors: {self.errors}.",
+        ]
+        return '\n'.join(lines)
+
+
+def open_orders(older_than, batch_size):
+    """
+    Yield batches of (order id, created_at) for orders whose payment never
+    resolved, keyset-paginated on the primary key so each batch is a fresh,
+    cheap range query.
+    """
+    queryset = Order.objects.filter(
+        payment_status__in=OPEN_PAYMENT_STATUSES,
+        created_at__lt=timezone.now() - older_than,
+    ).order_by('order_id')
+    last = None
+    while True:
+        batch = queryset.filter(order_id__gt=last) if last is not None else queryset
+        orders = list(batch.values_list('order_id', 'created_at')[:batch_size])
+        if not orders:
+            return
+        yield orders
+        last = orders[-1][0]
+
+
+def check_order(gateway, limiter, order_id):
+    """Runs in a worker thread: gateway I/O only, no database access."""
+    limiter.acquire()
+    try:
+        payments = gateway.fetch_payments(order_id)
+    except GatewayError as e:
+        return order_id, None, e
+    return order_id, gateway_status(payment_statuses(payments)), None
+
+
+def apply_results(changes, stats):
+    """
+    Write resolved payment states, one call per status. Orders a webhook
+    resolved meanwhile are not touched again, so they are not notified twice.
+    """
+    for new_status, order_ids in changes.items():
+        stats.updated[new_status] += len(apply_payment_statuses(order_ids, new_status))
+
+
+def reconcile_payments(workers=8, rate=20, batch_size=200, older_than=datetime.timedelta(minutes=15),
+                       expire_after=datetime.timedelta(hours=24), gateway=None, progress=None):
+    """
+    Ask the gateway about every order stuck in an open payment state and
+    apply whatever resolved. Orders still unpaid `expire_after` after
+    checkout are marked expired, so abandoned checkouts drop out of later
+    runs instead of being asked about forever.
+
+    Gateway calls fan out over a bounded thread pool behind a shared rate
+    limit; the database is only touched from the calling thread. Stops early
+    if the gateway's circuit breaker opens. Returns a ReconcileStats.
+    """
+    gateway = gateway or get_gateway()
+    limiter = RateLimiter(rate)
+    stats = ReconcileStats()
+
+    expire_before = timezone.now() - expire_after
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for orders in open_orders(older_than, batch_size):
+            created = dict(orders)
+            changes = defaultdict(list)
+            for order_id, new_status, error in pool.map(lambda pk: check_order(gateway, limiter, pk), created):
+                stats.checked += 1
+                if error is not None:
+                    stats.errors += 1
+                elif new_status in RESOLVED_STATUSES:
+                    changes[new_status].append(order_id)
+                elif created[order_id] < expire_before:
+                    changes['expired'].append(order_id)
+                else:
+                    stats.unchanged += 1
+            apply_results(changes, stats)
+            if progress:
+                progress(stats)
+            if gateway.breaker.state == 'open':
+                break
+    return stats
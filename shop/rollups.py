@@ -0,0 +1,118 @@
+from collections import defaultdict
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from shop.models import Order, OutletSalesRollup, OutletItemSalesRollup
+
+# Payment states that count as a sale; the webhook records `success`.
+PAID_STATUSES = ('success', 'paid')
+
+CENT = Decimal('0.01')
+
+
+def sale_orders(queryset):
+    """Narrow an order queryset down to the orders that count as sales."""
+    return queryset.exclude(status='cancelled').filter(
+        Q(status='completed') | Q(payment_status__in=PAID_STATUSES)
+    )
+
+
+def sale_bucket(order):
+    """Return the local (date, hour) an order is counted under."""
+    local = order.created_at.astimezone(ZoneInfo(order.outlet.timezone))
+    return local.date(), local.hour
+
+
+def sale_lines(order):
+    """Return (food_item_id, quantity, revenue) for every line of the order."""
+    items = order.items.select_related('food_item', 'variant').prefetch_related('addons')
+    return [
+        (item.food_item_id, item.quantity, Decimal(str(item.get_total_price())).quantize(CENT))
+        for item in items
+    ]
+
+
+def apply_sale(order, sign):
+    day, hour = sale_bucket(order)
+    rollup, _ = OutletSalesRollup.objects.get_or_create(outlet_id=order.outlet_id, date=day, hour=hour)
+    OutletSalesRollup.objects.filter(pk=rollup.pk).update(
+        order_count=F('order_count') + sign,
+        revenue=F('revenue') + sign * order.total,
+    )
+    for food_item_id, quantity, revenue in sale_lines(order):
+        item_rollup, _ = OutletItemSalesRollup.objects.get_or_create(
+            outlet_id=order.outlet_id, food_item_id=food_item_id, date=day)
+        OutletItemSalesRollup.objects.filter(pk=item_rollup.pk).update(
+            quantity=F('quantity') + sign * quantity,
+            revenue=F('revenue') + sign * revenue,
+        )
+
+
+@transaction.atomic
+def record_order_sale(order):
+    """
+    Add an order to the rollups the first time it is paid or completed.
+
+    The rolled_up flag is claimed with a conditional UPDATE, so the payment
+    webhook and the completion transition can both call this safely.
+    """
+    if not Order.objects.filter(pk=order.pk, rolled_up=False).update(rolled_up=True):
+        return False
+    order.rolled_up = True
+    apply_sale(order, 1)
+    return True
+
+
+@transaction.atomic
+def remove_order_sale(order):
+    """Take a cancelled order back out of the rollups if it was counted."""
+    if not Order.objects.filter(pk=order.pk, rolled_up=True).update(rolled_up=False):
+        return False
+    order.rolled_up = False
+    apply_sale(order, -1)
+    return True
+
+
+@transaction.atomic
+def rebuild_outlet_rollups(outlet, start_day=None, end_day=None):
+    """Recompute an outlet's rollups from the raw orders, optionally for a date range."""
+    orders = Order.objects.filter(outlet=outlet)
+    rollups = OutletSalesRollup.objects.filter(outlet=outlet)
+    item_rollups = OutletItemSalesRollup.objects.filter(outlet=outlet)
+    if start_day:
+        orders = orders.filter(created_at__gte=outlet.get_day_bounds(start_day)[0])
+        rollups = rollups.filter(date__gte=start_day)
+        item_rollups = item_rollups.filter(date__gte=start_day)
+    if end_day:
+        orders = orders.filter(created_at__lt=outlet.get_day_bounds(end_day)[1])
+        rollups = rollups.filter(date__lte=end_day)
+        item_rollups = item_rollups.filter(date__lte=end_day)
+
+    rollups.delete()
+    item_rollups.delete()
+    orders.filter(rolled_up=True).update(rolled_up=False)
+
+    hourly = defaultdict(lambda: [0, Decimal('0')])
+    daily_items = defaultdict(lambda: [0, Decimal('0')])
+    sales = sale_orders(orders)
+    for order in sales.select_related('outlet').iterator(chunk_size=500):
+        day, hour = sale_bucket(order)
+        hourly[(day, hour)][0] += 1
+        hourly[(day, hour)][1] += order.total
+        for food_item_id, quantity, revenue in sale_lines(order):
+            daily_items[(food_item_id, day)][0] += quantity
+            daily_items[(food_item_id, day)][1] += revenue
+
+    OutletSalesRollup.objects.bulk_create([
+        OutletSalesRollup(outlet=outlet, date=day, hour=hour, order_count=count, revenue=revenue)
+        for (day, hour), (count, revenue) in hourly.items()
+    ], batch_size=500)
+    OutletItemSalesRollup.objects.bulk_create([
+        OutletItemSalesRollup(outlet=outlet, food_item_id=food_item_id, date=day, quantity=quantity, revenue=revenue)
+        for (food_item_id, day), (quantity, revenue) in daily_items.items()
+    ], batch_size=500)
+    sales.update(rolled_up=True)
+    return sum(count for count, _ in hourly.values())
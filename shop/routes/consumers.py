@@ -1,17 +1,43 @@
+import asyncio
 import json
+from collections import deque
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from project.metrics import get_metrics
+from shop.menu_access import can_follow_menu, get_menu_access
+from shop.models import Order
+from shop.notifications import encode, order_group, order_state, seller_group
+from shop.seller_events import batch_frame, compact_events, replay_frames, resync_frame
+
+stream_metrics = get_metrics('seller_stream')
+
+
 class OrderConsumer(AsyncWebsocketConsumer):
+    """
+    Read-only tracking channel for one order, open only to the customer who
+    placed it. Sends the order's current state on connect, then a push
+    whenever its payment, status or ETA changes.
+    """
     async def connect(self):
         self.order_id = self.scope['url_route']['kwargs']['order_id']
-        self.room_group_name = f'order_{self.order_id}'
+        self.room_group_name = order_group(self.order_id)
+
+        user = self.scope.get('user')
+        snapshot = await self.get_snapshot(user) if user and user.is_authenticated else None
+        # Accept before closing so the client sees the close code, not a bare handshake failure.
+        await self.accept(self.scope.get('subprotocol'))
+        if snapshot is None:
+            await self.close(code=4403)
+            return
 
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-
-        await self.accept()
+        await self.send(text_data=snapshot)
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
@@ -19,59 +45,200 @@ class OrderConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        message = data['message']
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'order_update',
-                'message': message
-            }
-        )
+    async def receive(self, text_data=None, bytes_data=None):
+        # Customers only listen; updates come from the server.
+        pass
 
     async def order_update(self, event):
-        message = event['message']
+        await self.send(text_data=event['text'])
 
-        await self.send(text_data=json.dumps({
-            'message': message
-        }))
+    @database_sync_to_async
+    def get_snapshot(self, user):
+        order = Order.objects.filter(order_id=self.order_id, user_id=user.id).first()
+        if order is None:
+            return None
+        return encode(order_state(order, 'snapshot'))
 
 class SellerConsumer(AsyncWebsocketConsumer):
+    """
+    Live event stream for an outlet's dashboards. Every server frame carries
+    a sequence number; a tablet reconnecting with ?last_seq=<n> first gets
+    the events it missed, or a resync frame if they are no longer logged.
+
+    Events are coalesced for `coalesce_window` seconds and sent as a single
+    {"events": [...]} frame.
+
+    send() only hands a frame to the server, so a slow tablet is spotted by
+    its acknowledgements instead: a tablet sends {"ack": <seq>} with the
+    highest sequence number it has processed. Once it does, no more than
+    `max_unacked` events are left unacknowledged. Further events wait in
+    pending, where events superseded by newer ones for the same order are
+    dropped, and a backlog beyond `max_pending` is replaced by a resync
+    frame. Tablets that never ack get every batch as it is ready.
+
+    Either way, a connection with more than `max_buffered` events sent but
+    unacknowledged is closed with code 4429; the tablet reconnects with
+    ?last_seq and replays from there. For tablets that never ack this
+    means a reconnect every `max_buffered` events.
+    """
+    coalesce_window = 0.15
+    max_pending = 200
+    max_unacked = 100
+    max_buffered = 1000
+    # Sequence numbers come from one table but are written by several
+    # processes, so live events can arrive out of order. Duplicates are
+    # recognised by remembering this many recently seen numbers.
+    seen_limit = 2048
+
     async def connect(self):
         self.seller_id = self.scope['url_route']['kwargs']['menu_slug']
-        self.room_group_name = f'seller_{self.seller_id}'
+        self.room_group_name = seller_group(self.seller_id)
+        self.last_seq = 0
+        self.resume_seq = 0
+        self.seen = set()
+        self.seen_order = deque()
+        self.pending = []
+        self.flush_task = None
+        self.acking = False
+        self.in_flight = deque()  # (highest seq sent so far, events) per unacknowledged frame
+        self.unacked = 0
+        self.sent_seq = 0
+        self.overflowed = False
+
+        # The menu's outlet and manager come from the shared cache, not the database.
+        self.access = await database_sync_to_async(get_menu_access)(self.seller_id)
+        await self.accept(self.scope.get('subprotocol'))
+        if not can_follow_menu(self.scope.get('user'), self.access):
+            await self.close(code=4403)
+            return
 
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-        print(f"Added {self.channel_name} channel to {self.room_group_name}")
-        await self.accept()
+
+        # Live events queue up behind this handler, so replaying after joining
+        # the group leaves no gap. Replayed events are marked seen so their
+        # live copies are dropped; only the tablet's own resume point is
+        # treated as a high-water mark.
+        last_seq = self.get_last_seq()
+        if last_seq is not None:
+            self.last_seq = self.resume_seq = last_seq
+            for seq, text in await self.get_missed_frames(last_seq):
+                self.mark_seen(seq)
+                await self.send_frame(text, [seq])
 
     async def disconnect(self, close_code):
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        print("Received message", text_data)
-        data = json.loads(text_data)
-        message = data['message']
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'seller_notification',
-                'message': message
-            }
-        )
+    async def receive(self, text_data=None, bytes_data=None):
+        # The stream is server-driven; the only thing a tablet sends is acks.
+        try:
+            data = json.loads(text_data or '')
+        except ValueError:
+            return
+        if not isinstance(data, dict) or 'ack' not in data:
+            return
+        try:
+            await self.acknowledge(int(data['ack']))
+        except (TypeError, ValueError):
+            pass
 
     async def seller_notification(self, event):
-        print("Received notification")
-        message = event['message']
-        await self.send(text_data=json.dumps({
-            'message': message
-        }))
+        if self.overflowed:
+            return
+        # Events arrive in batches, pre-encoded once for the whole group.
+        for live in event['events']:
+            if live['seq'] <= self.resume_seq or live['seq'] in self.seen:
+                continue
+            self.mark_seen(live['seq'])
+            self.pending.append(live)
+        if len(self.pending) > self.max_pending:
+            self.shed_backlog()
+        if self.pending and self.flush_task is None and not self.lagging():
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    def mark_seen(self, seq):
+        self.seen.add(seq)
+        self.seen_order.append(seq)
+        if len(self.seen_order) > self.seen_limit:
+            self.seen.discard(self.seen_order.popleft())
+        self.last_seq = max(self.last_seq, seq)
+
+    def lagging(self):
+        return self.acking and self.unacked >= self.max_unacked
+
+    async def send_frame(self, text, seqs):
+        if self.overflowed:
+            return
+        # Frames are delivered in order, so an ack covers every frame up to
+        # the one that first carried that sequence number.
+        self.sent_seq = max(self.sent_seq, *seqs)
+        self.in_flight.append((self.sent_seq, len(seqs)))
+        self.unacked += len(seqs)
+        if self.unacked > self.max_buffered:
+            stream_metrics.incr('overflows')
+            self.overflowed = True
+            self.pending = []
+            await self.close(code=4429)
+            return
+        await self.send(text_data=text)
+
+    async def acknowledge(self, seq):
+        self.acking = True
+        while self.in_flight and self.in_flight[0][0] <= seq:
+            self.unacked -= self.in_flight.popleft()[1]
+        stream_metrics.observe('unacked', self.unacked)
+        if self.pending and self.flush_task is None and not self.lagging():
+            # These were held back, so newer events may supersede older ones.
+            self.compact_pending()
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    def compact_pending(self):
+        before = len(self.pending)
+        self.pending = compact_events(self.pending)
+        stream_metrics.incr('compacted', before - len(self.pending))
+
+    def shed_backlog(self):
+        self.compact_pending()
+        if len(self.pending) > self.max_pending:
+            stream_metrics.incr('dropped', len(self.pending))
+            stream_metrics.incr('resyncs')
+            seq, text = resync_frame(self.last_seq)
+            self.pending = [{'seq': seq, 'order_id': None, 'has_lines': True, 'text': text}]
+
+    async def flush_later(self):
+        try:
+            await asyncio.sleep(self.coalesce_window)
+            behind = False
+            # Events arriving while a batch is being sent go out right after it,
+            # minus anything newer events already supersede.
+            while self.pending and not self.lagging():
+                if behind:
+                    self.compact_pending()
+                behind = True
+                batch, self.pending = self.pending, []
+                stream_metrics.observe('batch_size', len(batch))
+                await self.send_frame(batch_frame([event['text'] for event in batch]), [event['seq'] for event in batch])
+            if self.pending:
+                # The tablet is behind on acks; the next ack resumes sending.
+                stream_metrics.incr('stalled')
+                self.compact_pending()
+        finally:
+            self.flush_task = None
+
+    def get_last_seq(self):
+        params = parse_qs(self.scope.get('query_string', b'').decode('latin-1'))
+        try:
+            return int(params['last_seq'][0])
+        except (KeyError, ValueError):
+            return None
+
+    @database_sync_to_async
+    def get_missed_frames(self, last_seq):
+        return replay_frames(self.access['outlet_id'], last_seq)
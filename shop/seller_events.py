@@ -0,0 +1,93 @@
+import datetime
+
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from shop.models import Outlet, SellerEvent
+
+REPLAY_LIMIT = 500  # beyond this many missed events a refetch is cheaper
+KEEP_PER_OUTLET = 1000
+MAX_AGE = datetime.timedelta(days=1)
+DELETE_CHUNK = 5000
+
+
+def frame(seq, payload):
+    """Wrap an already-encoded envelope into the frame sent to dashboards."""
+    return f'{{"seq":{seq},"message":{payload}}}'
+
+
+def resync_frame(seq):
+    return seq, frame(seq, '{"event":"resync"}')
+
+
+def batch_frame(texts):
+    """Join already-encoded frames into one, without decoding them."""
+    if len(texts) == 1:
+        return texts[0]
+    return '{"events":[' + ','.join(texts) + ']}'
+
+
+def compact_events(events):
+    """
+    Drop events a later event for the same order supersedes. Every envelope
+    carries the order's full status, so only the newest one matters, except
+    for events carrying lines (a newly paid order), which are always kept.
+    """
+    latest = {}
+    for position, event in enumerate(events):
+        latest[event['order_id']] = position
+    return [
+        event for position, event in enumerate(events)
+        if event['has_lines'] or latest[event['order_id']] == position
+    ]
+
+
+def append_event(outlet_id, payload):
+    """Log an encoded seller event and return its sequence number."""
+    return SellerEvent.objects.create(outlet_id=outlet_id, payload=payload).id
+
+
+def head_seq(outlet_id):
+    """The sequence number of the outlet's latest event, or 0."""
+    return SellerEvent.objects.filter(outlet_id=outlet_id).aggregate(head=Max('id'))['head'] or 0
+
+
+def replay_frames(outlet_id, last_seq, limit=REPLAY_LIMIT):
+    """
+    Return (seq, frame) for every event a tablet missed after `last_seq`,
+    oldest first.
+
+    Events are trimmed oldest first, so the missed events are complete as
+    long as the last one the tablet saw is still in the log. Otherwise (or
+    when it missed too many) it gets a single resync frame telling it to
+    refetch live-orders/ and resume from the given sequence number.
+    """
+    events = SellerEvent.objects.filter(outlet_id=outlet_id)
+    if last_seq and not events.filter(id=last_seq).exists():
+        return [resync_frame(head_seq(outlet_id))]
+    missed = list(events.filter(id__gt=last_seq).order_by('id').values_list('id', 'payload')[:limit + 1])
+    if len(missed) > limit:
+        return [resync_frame(head_seq(outlet_id))]
+    return [(seq, frame(seq, payload)) for seq, payload in missed]
+
+
+def trim_seller_events(keep=KEEP_PER_OUTLET, max_age=MAX_AGE):
+    """
+    Cap every outlet's log at its `keep` newest events and drop anything
+    older than `max_age`, deleting in chunks. Returns the rows removed.
+    """
+    removed = 0
+    cutoff = timezone.now() - max_age
+    for outlet_id in Outlet.objects.values_list('id', flat=True).iterator():
+        events = SellerEvent.objects.filter(outlet_id=outlet_id)
+        condition = Q(created_at__lt=cutoff)
+        boundary = list(events.order_by('-id').values_list('id', flat=True)[keep:keep + 1])
+        if boundary:
+            condition |= Q(id__lte=boundary[0])
+        stale = events.filter(condition)
+        while True:
+            ids = list(stale.order_by('id').values_list('id', flat=True)[:DELETE_CHUNK])
+            if not ids:
+                break
+            removed += SellerEvent.objects.filter(id__in=ids).delete()[0]
+    return removed
@@ -1,3 +1,634 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import json
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.middleware import JWTAuthMiddleware
+from authentication.models import CustomUser
+from shop.fake_gateway import FakeGateway, FakeGatewayAdapter, make_server, sign_webhook
+from shop.gateway import CashfreeClient, CircuitBreaker, GatewayError, GatewayUnavailable
+from shop.archive import archive_orders, archived_months, drop_month, export_month, months_ago
+from shop.models import (
+    ArchivedOrder, Cart, CartItem, FoodCategory, FoodItem, KitchenQueue, Menu, Order, OrderItem, Outlet, Shop, WebhookEvent,
+)
+from shop.notifications import seller_group
+from shop.payment_status import refresh_payment_state
+from shop.reconcile import apply_results, reconcile_payments
+from shop.order_status import InvalidTransition, TransitionConflict, transition_order
+from shop.routes.consumers import SellerConsumer
+from shop.routes.routing import websocket_urlpatterns
+from shop.webhooks import run_event, store_event
+
+FAKE_BASE_URL = 'fake://cashfree/pg'
+FAKE_SECRET = 'test-secret'
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def make_outlet(manager, slug='taco-main'):
+    shop = Shop.objects.create(name='Taco', owner='owner')
+    outlet = Outlet.objects.create(shop=shop, name='Main', location='Street', phone='1', outlet_manager=manager)
+    menu = Menu.objects.create(menu_slug=slug, outlet=outlet)
+    return outlet, menu
+
+
+def fake_client(gateway=None, breaker=None, **options):
+    """A CashfreeClient answered in-process by a FakeGateway."""
+    gateway = gateway or FakeGateway(FAKE_SECRET)
+    options.setdefault('backoff', 0)
+    client = CashfreeClient(FAKE_BASE_URL, 'test-app', FAKE_SECRET, '2023-08-01', breaker=breaker, **options)
+    client.session.mount('fake://', FakeGatewayAdapter(gateway, FAKE_BASE_URL))
+    return client
+
+
+class CountingGateway(FakeGateway):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def handle(self, method, path, headers, body):
+        self.calls += 1
+        return super().handle(method, path, headers, body)
+
+
+def webhook_body(order, payment_status, payment_id='1'):
+    return json.dumps({
+        'data': {
+            'order': {'order_id': str(order.order_id), 'order_amount': float(order.total)},
+            'payment': {'cf_payment_id': payment_id, 'payment_status': payment_status},
+        },
+        'type': 'PAYMENT_SUCCESS_WEBHOOK' if payment_status == 'SUCCESS' else 'PAYMENT_FAILED_WEBHOOK',
+    })
+
+
+def live_event(seq, order_id):
+    return {
+        'seq': seq,
+        'order_id': order_id,
+        'has_lines': False,
+        'text': f'{{"seq":{seq},"message":{{"order_id":"{order_id}"}}}}',
+    }
+
+
+def live_events(*events):
+    return {'type': 'seller_notification', 'events': list(events)}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class SellerStreamTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = CustomUser.objects.create_user(
+            email='m@example.com', password='pw', role='owner', phone_number='+910000000001')
+        self.outlet, self.menu = make_outlet(self.manager)
+        self.application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    async def connect(self):
+        token = str(AccessToken.for_user(self.manager))
+        communicator = WebsocketCommunicator(
+            self.application, f'/ws/sellers/{self.menu.menu_slug}/', subprotocols=['jwt', token])
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def received_seqs(self, communicator):
+        seqs = []
+        while not await communicator.receive_nothing(timeout=0.3):
+            frame = json.loads(await communicator.receive_from())
+            seqs.extend(event['seq'] for event in frame.get('events', [frame]))
+        return seqs
+
+    async def test_out_of_order_events_are_delivered(self):
+        # Sequence numbers are allocated by different processes, so a lower
+        # one may be published after a higher one.
+        communicator = await self.connect()
+        layer = get_channel_layer()
+        group = seller_group(self.menu.menu_slug)
+        await layer.group_send(group, live_events(live_event(11, 'b')))
+        await layer.group_send(group, live_events(live_event(10, 'a')))
+        self.assertEqual(sorted(await self.received_seqs(communicator)), [10, 11])
+        await communicator.disconnect()
+
+    async def test_duplicate_events_are_dropped(self):
+        communicator = await self.connect()
+        layer = get_channel_layer()
+        group = seller_group(self.menu.menu_slug)
+        await layer.group_send(group, live_events(live_event(10, 'a')))
+        await layer.group_send(group, live_events(live_event(10, 'a')))
+        self.assertEqual(await self.received_seqs(communicator), [10])
+        await communicator.disconnect()
+
+    async def test_deactivated_manager_cannot_connect(self):
+        await database_sync_to_async(CustomUser.objects.filter(pk=self.manager.pk).update)(is_active=False)
+        token = str(AccessToken.for_user(self.manager))
+        communicator = WebsocketCommunicator(
+            self.application, f'/ws/sellers/{self.menu.menu_slug}/', subprotocols=['jwt', token])
+        await communicator.connect()
+        self.assertEqual(await communicator.receive_output(), {'type': 'websocket.close', 'code': 4403})
+
+    async def test_client_messages_are_not_relayed(self):
+        communicator, other = await self.connect(), await self.connect()
+        for text in ('[1]', '"x"', 'not json', json.dumps({'message': {'event': 'paid'}})):
+            await communicator.send_to(text_data=text)
+        self.assertTrue(await other.receive_nothing(timeout=0.3))
+        # The consumer survived all of them.
+        await get_channel_layer().group_send(seller_group(self.menu.menu_slug), live_events(live_event(1, 'a')))
+        self.assertEqual(await self.received_seqs(communicator), [1])
+        await communicator.disconnect()
+        await other.disconnect()
+
+    async def ack(self, communicator, seq):
+        await communicator.send_to(text_data=json.dumps({'ack': seq}))
+        await asyncio.sleep(0.05)
+
+    @mock.patch.object(SellerConsumer, 'max_unacked', 2)
+    async def test_unacknowledged_tablet_is_held_back(self):
+        communicator = await self.connect()
+        await self.ack(communicator, 0)
+        layer = get_channel_layer()
+        group = seller_group(self.menu.menu_slug)
+        await layer.group_send(group, live_events(live_event(1, 'a')))
+        await layer.group_send(group, live_events(live_event(2, 'b')))
+        self.assertEqual(await self.received_seqs(communicator), [1, 2])
+
+        for seq, order_id in ((3, 'a'), (4, 'a'), (5, 'b')):
+            await layer.group_send(group, live_events(live_event(seq, order_id)))
+        self.assertEqual(await self.received_seqs(communicator), [])
+
+        # Catching up releases the held events, minus the superseded one.
+        await self.ack(communicator, 2)
+        self.assertEqual(await self.received_seqs(communicator), [4, 5])
+        await communicator.disconnect()
+
+    @mock.patch.object(SellerConsumer, 'max_unacked', 1)
+    @mock.patch.object(SellerConsumer, 'max_pending', 2)
+    async def test_backlog_of_a_stalled_tablet_becomes_a_resync(self):
+        communicator = await self.connect()
+        await self.ack(communicator, 0)
+        layer = get_channel_layer()
+        group = seller_group(self.menu.menu_slug)
+        await layer.group_send(group, live_events(live_event(1, 'a')))
+        self.assertEqual(await self.received_seqs(communicator), [1])
+
+        for seq in range(2, 5):
+            await layer.group_send(group, live_events(live_event(seq, f'order-{seq}')))
+            await asyncio.sleep(SellerConsumer.coalesce_window * 2)
+        await self.ack(communicator, 1)
+        frame = json.loads(await communicator.receive_from())
+        self.assertEqual(frame, {'seq': 4, 'message': {'event': 'resync'}})
+        self.assertTrue(await communicator.receive_nothing(timeout=0.3))
+        await communicator.disconnect()
+
+
+    @mock.patch.object(SellerConsumer, 'max_buffered', 3)
+    async def test_tablet_that_never_acks_is_closed_past_the_cap(self):
+        communicator = await self.connect()
+        layer = get_channel_layer()
+        group = seller_group(self.menu.menu_slug)
+        for seq in range(1, 5):
+            await layer.group_send(group, live_events(live_event(seq, f'order-{seq}')))
+            await asyncio.sleep(SellerConsumer.coalesce_window * 2)
+        outputs = [await communicator.receive_output() for _ in range(4)]
+        self.assertEqual([json.loads(output['text'])['seq'] for output in outputs[:3]], [1, 2, 3])
+        self.assertEqual(outputs[3], {'type': 'websocket.close', 'code': 4429})
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class KitchenQueueTests(TestCase):
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(
+            email='c@example.com', password='pw', role='customer', phone_number='+919999999999')
+        self.outlet, self.menu = make_outlet(None)
+
+    def apply_webhook(self, order, payment_status, payment_id='1'):
+        event = store_event(webhook_body(order, payment_status, payment_id).encode('utf-8'), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(run_event(event.pk))
+
+    def queue(self):
+        return KitchenQueue.objects.filter(outlet=self.outlet).first()
+
+    def test_failed_payment_never_enters_the_queue(self):
+        order = Order.objects.create(user=self.customer, outlet=self.outlet, total=10)
+        self.apply_webhook(order, 'FAILED')
+        self.assertIsNone(self.queue())
+        order.refresh_from_db()
+        self.assertIsNone(order.promised_at)
+
+    def test_paid_order_is_queued_once(self):
+        order = Order.objects.create(user=self.customer, outlet=self.outlet, total=10)
+        self.apply_webhook(order, 'SUCCESS', '1')
+        busy_until = self.queue().busy_until
+        self.apply_webhook(order, 'SUCCESS', '2')
+        self.assertEqual(self.queue().open_orders, 1)
+        self.assertEqual(self.queue().busy_until, busy_until)
+        order.refresh_from_db()
+        self.assertIsNotNone(order.promised_at)
+
+    def test_late_failure_does_not_undo_a_success(self):
+        order = Order.objects.create(user=self.customer, outlet=self.outlet, total=10)
+        self.apply_webhook(order, 'SUCCESS', '1')
+        with mock.patch('shop.payment_status.notify_payments') as notify:
+            self.apply_webhook(order, 'FAILED', '2')
+        notify.assert_not_called()
+        order.refresh_from_db()
+        self.assertEqual((order.payment_status, order.transaction_status), ('success', 'success'))
+        self.assertTrue(order.rolled_up)
+        self.assertEqual(self.queue().open_orders, 1)
+
+    def test_polled_success_is_queued_and_rolled_up(self):
+        order = Order.objects.create(user=self.customer, outlet=self.outlet, total=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            state = refresh_payment_state(order, lambda order_id: ['FAILED', 'SUCCESS'])
+        self.assertEqual(state['payment_status'], 'success')
+        order.refresh_from_db()
+        self.assertTrue(order.rolled_up)
+        self.assertEqual(self.queue().open_orders, 1)
+
+    def test_success_after_a_failed_attempt_is_applied(self):
+        order = Order.objects.create(user=self.customer, outlet=self.outlet, total=10)
+        self.apply_webhook(order, 'FAILED', '1')
+        self.apply_webhook(order, 'SUCCESS', '2')
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, 'success')
+        self.assertEqual(self.queue().open_orders, 1)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class OrderTransitionTests(TestCase):
+    def setUp(self):
+        self.manager = CustomUser.objects.create_user(
+            email='m@example.com', password='pw', role='owner', phone_number='+910000000001')
+        customer = CustomUser.objects.create_user(
+            email='c@example.com', password='pw', role='customer', phone_number='+919999999999')
+        self.outlet, self.menu = make_outlet(self.manager)
+        self.order = Order.objects.create(user=customer, outlet=self.outlet, total=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def put_status(self, new_status):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(f'/api/shop/live-orders/{self.order.order_id}/', {'status': new_status}, format='json')
+
+    def test_racing_transitions_have_one_winner(self):
+        # Both tablets loaded the order while it was still pending.
+        first, second = Order.objects.get(pk=self.order.pk), Order.objects.get(pk=self.order.pk)
+        outcomes = []
+        for order, new_status in ((first, 'processing'), (second, 'cancelled')):
+            try:
+                with self.captureOnCommitCallbacks(execute=True):
+                    transition_order(order, new_status)
+                outcomes.append(new_status)
+            except TransitionConflict:
+                outcomes.append('conflict')
+
+        self.assertEqual(outcomes, ['processing', 'conflict'])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'processing')
+        self.assertEqual(self.order.version, first.version)
+
+    def test_terminal_status_cannot_be_left(self):
+        self.order.status = 'cancelled'
+        with self.assertRaises(InvalidTransition):
+            transition_order(self.order, 'processing')
+
+    def test_repeated_transition_is_rejected(self):
+        self.assertEqual(self.put_status('processing').status_code, 200)
+        response = self.put_status('processing')
+        self.assertEqual(response.status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'processing')
+
+    def test_stale_request_reports_the_current_status(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        Order.objects.filter(pk=self.order.pk).update(status='processing')
+        with mock.patch('shop.api.views.get_object_or_404', return_value=stale):
+            response = self.put_status('cancelled')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['status'], 'processing')
+
+
+class CashfreeClientTests(TestCase):
+    def test_idempotent_create_survives_transient_failures(self):
+        gateway = CountingGateway(FAKE_SECRET)
+        client = fake_client(gateway, max_retries=2)
+        with mock.patch('shop.fake_gateway.random.random', side_effect=[0.0, 0.0, 0.9, 0.9]):
+            gateway.failure_rate = 0.5
+            order = client.create_order({'order_id': 'order-1', 'order_amount': 10.0})
+        self.assertEqual(order['order_id'], 'order-1')
+        self.assertEqual(gateway.calls, 3)
+
+    def test_retries_give_up_with_gateway_unavailable(self):
+        gateway = CountingGateway(FAKE_SECRET, failure_rate=1.0)
+        client = fake_client(gateway, max_retries=2)
+        with self.assertRaises(GatewayUnavailable) as raised:
+            client.fetch_payments('order-1')
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(gateway.calls, 3)
+
+    def test_client_errors_are_not_retried(self):
+        gateway = CountingGateway(FAKE_SECRET)
+        client = fake_client(gateway, max_retries=2)
+        with self.assertRaises(GatewayError) as raised:
+            client.fetch_payments('missing')
+        self.assertNotIsInstance(raised.exception, GatewayUnavailable)
+        self.assertEqual(raised.exception.status_code, 404)
+        self.assertEqual(gateway.calls, 1)
+
+    def test_slow_gateway_times_out(self):
+        gateway = FakeGateway(FAKE_SECRET, latency_ms=200)
+        client = fake_client(gateway, read_timeout=0.05, max_retries=1)
+        with self.assertRaisesRegex(GatewayUnavailable, 'unreachable'):
+            client.fetch_payments('order-1')
+
+    def test_breaker_opens_and_recovers(self):
+        gateway = CountingGateway(FAKE_SECRET, failure_rate=1.0)
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        client = fake_client(gateway, breaker=breaker, max_retries=0)
+        for _ in range(2):
+            with self.assertRaises(GatewayUnavailable):
+                client.fetch_payments('order-1')
+        self.assertEqual(breaker.state, 'open')
+
+        with self.assertRaisesRegex(GatewayUnavailable, 'circuit is open'):
+            client.fetch_payments('order-1')
+        self.assertEqual(gateway.calls, 2)
+
+        # Once the reset timeout passes one trial call goes through and closes it.
+        gateway.failure_rate = 0
+        gateway.create_order({'order_id': 'order-1', 'order_amount': 10.0})
+        breaker.opened_at -= breaker.reset_timeout
+        self.assertEqual(breaker.state, 'half_open')
+        client.fetch_payments('order-1')
+        self.assertEqual(breaker.state, 'closed')
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class ReconcileTests(TestCase):
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(
+            email='c@example.com', password='pw', role='customer', phone_number='+919999999999')
+        self.outlet, self.menu = make_outlet(None)
+        self.gateway = FakeGateway(FAKE_SECRET, deliver=lambda url, body, headers: None)
+
+    def order(self, payment_status=None, minutes_ago=60):
+        order = Order.objects.create(user=self.customer, outlet=self.outlet, total=10)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - datetime.timedelta(minutes=minutes_ago))
+        self.gateway.create_order({'order_id': str(order.order_id), 'order_amount': 10})
+        if payment_status:
+            self.gateway.pay(str(order.order_id), payment_status)
+        return order
+
+    def reconcile(self, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            return reconcile_payments(workers=2, rate=1000, gateway=fake_client(self.gateway), **options)
+
+    def test_order_resolved_by_a_webhook_is_not_notified_again(self):
+        missed, delivered = self.order('SUCCESS'), self.order('SUCCESS')
+        # The webhook lands after reconcile asked the gateway, before it writes.
+        with mock.patch('shop.reconcile.apply_results', side_effect=lambda changes, stats: (
+                Order.objects.filter(pk=delivered.pk).update(payment_status='success', transaction_status='success'),
+                apply_results(changes, stats))):
+            with mock.patch('shop.payment_status.notify_payments') as notify:
+                stats = self.reconcile()
+        self.assertEqual(stats.checked, 2)
+        self.assertEqual(stats.updated['success'], 1)
+        self.assertEqual([order.pk for call in notify.call_args_list for order in call.args[0]], [str(missed.pk)])
+
+    def test_paid_orders_reach_the_kitchen_in_one_message(self):
+        paid = [self.order('SUCCESS') for _ in range(3)]
+        with mock.patch('shop.notifications.send_to_group') as send:
+            self.reconcile()
+        seller_messages = [call.args[1] for call in send.call_args_list if call.args[0] == seller_group(self.menu.menu_slug)]
+        self.assertEqual(len(seller_messages), 1)
+        self.assertCountEqual([event['order_id'] for event in seller_messages[0]['events']],
+                              [str(order.pk) for order in paid])
+
+    def test_abandoned_checkout_expires(self):
+        abandoned, recent = self.order(minutes_ago=25 * 60), self.order()
+        stats = self.reconcile()
+        self.assertEqual((stats.updated['expired'], stats.unchanged), (1, 1))
+        abandoned.refresh_from_db()
+        self.assertEqual((abandoned.payment_status, abandoned.transaction_status), ('expired', 'failed'))
+        # Expired orders are not asked about again.
+        self.assertEqual(self.reconcile().checked, 1)
+
+    def test_late_payment_revives_an_expired_order(self):
+        order = self.order(minutes_ago=25 * 60)
+        self.reconcile()
+        self.gateway.pay(str(order.order_id), 'SUCCESS')
+        event = store_event(webhook_body(order, 'SUCCESS').encode('utf-8'), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(run_event(event.pk))
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, 'success')
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class FakeGatewayServerTests(LiveServerTestCase):
+    """The client against a `run_fake_gateway` server on a real socket."""
+
+    def setUp(self):
+        cache.clear()
+        self.gateway = CountingGateway(
+            FAKE_SECRET, webhook_url=f'{self.live_server_url}/api/shop/cashfree/webhook/')
+        server = make_server(self.gateway, port=0)
+        self.connections = 0
+        accept = server.get_request
+
+        def counting_accept():
+            self.connections += 1
+            return accept()
+
+        server.get_request = counting_accept
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.base_url = f'http://127.0.0.1:{server.server_address[1]}/pg'
+
+    def cashfree_client(self, **options):
+        options.setdefault('backoff', 0)
+        client = CashfreeClient(self.base_url, 'test-app', FAKE_SECRET, '2023-08-01', **options)
+        self.addCleanup(client.session.close)
+        return client
+
+    def test_calls_share_a_pooled_connection(self):
+        client = self.cashfree_client()
+        client.create_order({'order_id': 'order-1', 'order_amount': 10.0})
+        for _ in range(4):
+            self.assertEqual(client.fetch_payments('order-1'), [])
+        self.assertEqual(self.gateway.calls, 5)
+        self.assertEqual(self.connections, 1)
+
+    def test_failures_are_retried_over_http(self):
+        self.gateway.failure_rate = 1.0
+        with self.assertRaises(GatewayUnavailable) as raised:
+            self.cashfree_client(max_retries=2).fetch_payments('order-1')
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(self.gateway.calls, 3)
+
+    def test_slow_gateway_times_out_over_http(self):
+        self.gateway.latency_ms = 300
+        with self.assertRaisesRegex(GatewayUnavailable, 'unreachable'):
+            self.cashfree_client(read_timeout=0.1, max_retries=1).fetch_payments('order-1')
+
+    def test_signed_webhook_round_trip(self):
+        customer = CustomUser.objects.create_user(
+            email='c@example.com', password='pw', role='customer', phone_number='+919999999999')
+        outlet, _ = make_outlet(None)
+        order = Order.objects.create(user=customer, outlet=outlet, total=10)
+        client = self.cashfree_client()
+        client.create_order({'order_id': str(order.order_id), 'order_amount': 10.0})
+        # The webhook view verifies the signature with the app's own client.
+        with mock.patch('shop.gateway._client', client):
+            response = client.session.post(f'{self.base_url}/orders/{order.order_id}/pay',
+                                           json={'payment_status': 'SUCCESS'}, timeout=10)
+        self.assertEqual(response.status_code, 200)
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.order_id, str(order.order_id))
+        self.assertTrue(run_event(event.pk))
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, 'success')
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = CustomUser.objects.create_user(
+            email='c@example.com', password='pw', role='customer', phone_number='+919999999999')
+        self.outlet, self.menu = make_outlet(None)
+        category = FoodCategory.objects.create(menu=self.menu, name='Mains')
+        item = FoodItem.objects.create(menu=self.menu, name='Burrito', food_type='veg', food_category=category,
+                                       description='Beans', price=100, prepration_time=10)
+        self.cart = Cart.objects.create(user=self.customer, outlet=self.outlet)
+        CartItem.objects.create(item_id='1', cart=self.cart, food_item=item, quantity=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def checkout(self, gateway):
+        with mock.patch('shop.gateway._client', fake_client(gateway, max_retries=1)):
+            return self.client.post(f'/api/shop/checkout/{self.menu.menu_slug}/',
+                                    {'order_type': 'takeaway'}, format='json')
+
+    def test_checkout_creates_a_gateway_order(self):
+        response = self.checkout(FakeGateway(FAKE_SECRET))
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(response.data['order_id'], str(order.order_id))
+        self.assertTrue(order.payment_session_id)
+        self.assertFalse(Cart.objects.exists())
+
+    @override_settings(CASHFREE_RETURN_URL='http://localhost:3000/order/{order_id}',
+                       CASHFREE_NOTIFY_URL='http://localhost:8000/api/shop/cashfree/webhook/')
+    def test_callback_urls_come_from_settings(self):
+        gateway = FakeGateway(FAKE_SECRET)
+        self.checkout(gateway)
+        order = Order.objects.get()
+        meta = gateway.orders[str(order.order_id)]['order_meta']
+        self.assertEqual(meta['return_url'], f'http://localhost:3000/order/{order.order_id}')
+        self.assertEqual(meta['notify_url'], 'http://localhost:8000/api/shop/cashfree/webhook/')
+
+    def test_gateway_is_called_outside_a_transaction(self):
+        gateway = FakeGateway(FAKE_SECRET)
+        handle = gateway.handle
+
+        def handle_outside_a_transaction(*args):
+            self.in_atomic_blocks.append(len(connection.atomic_blocks))
+            return handle(*args)
+
+        self.in_atomic_blocks = []
+        gateway.handle = handle_outside_a_transaction
+        self.assertEqual(self.checkout(gateway).status_code, 201)
+        # Only TestCase's own transactions are open.
+        self.assertEqual(self.in_atomic_blocks, [len(connection.atomic_blocks)])
+
+    def test_unavailable_gateway_rolls_the_checkout_back(self):
+        response = self.checkout(FakeGateway(FAKE_SECRET, failure_rate=1.0))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 1)
+
+
+class WebhookSignatureTests(TestCase):
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(
+            email='c@example.com', password='pw', role='customer', phone_number='+919999999999')
+        self.outlet, self.menu = make_outlet(None)
+        self.order = Order.objects.create(user=self.customer, outlet=self.outlet, total=10)
+        self.client = APIClient()
+
+    def post(self, body, signature, timestamp='1700000000000'):
+        with mock.patch('shop.gateway._client', fake_client()):
+            return self.client.post('/api/shop/cashfree/webhook/', body, content_type='application/json',
+                                    HTTP_X_WEBHOOK_TIMESTAMP=timestamp, HTTP_X_WEBHOOK_SIGNATURE=signature)
+
+    def test_signed_webhook_is_stored(self):
+        body = webhook_body(self.order, 'SUCCESS')
+        response = self.post(body, sign_webhook(FAKE_SECRET, '1700000000000', body))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(WebhookEvent.objects.get().order_id, str(self.order.order_id))
+
+    def test_bad_signature_is_rejected(self):
+        body = webhook_body(self.order, 'SUCCESS')
+        response = self.post(body, sign_webhook('wrong-secret', '1700000000000', body))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_tampered_body_is_rejected(self):
+        body = webhook_body(self.order, 'FAILED')
+        signature = sign_webhook(FAKE_SECRET, '1700000000000', body)
+        response = self.post(body.replace('FAILED', 'SUCCESS'), signature)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_missing_signature_is_rejected(self):
+        self.assertEqual(self.post(webhook_body(self.order, 'SUCCESS'), '').status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(
+            email='c@example.com', password='pw', role='customer', phone_number='+919999999999')
+        self.outlet, self.menu = make_outlet(None)
+        category = FoodCategory.objects.create(menu=self.menu, name='Mains')
+        self.item = FoodItem.objects.create(menu=self.menu, name='Burrito', food_type='veg', food_category=category,
+                                            description='Beans', price=100, prepration_time=10)
+
+    def order(self, days_ago):
+        order = Order.objects.create(user=self.customer, outlet=self.outlet, total=10)
+        OrderItem.objects.create(order=order, food_item=self.item, quantity=2)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - datetime.timedelta(days=days_ago))
+        return order
+
+    def test_old_orders_move_to_the_archive(self):
+        recent, old = self.order(0), self.order(400)
+        self.assertEqual(archive_orders(months_ago(6), batch_size=1), 1)
+        self.assertEqual(list(Order.objects.values_list('pk', flat=True)), [str(recent.pk)])
+        self.assertFalse(OrderItem.objects.filter(order_id=old.pk).exists())
+        archived = ArchivedOrder.objects.get(pk=old.pk)
+        self.assertEqual(archived.items[0]['name'], 'Burrito')
+        self.assertEqual(archived.items[0]['quantity'], 2)
+
+    def test_exported_month_can_be_dropped(self):
+        old = self.order(400)
+        archive_orders(months_ago(6))
+        [start] = archived_months(months_ago(6))
+        with tempfile.TemporaryDirectory() as directory:
+            with gzip.open(export_month(start, directory), 'rt') as handle:
+                self.assertEqual(json.loads(handle.readline())['order_id'], str(old.pk))
+        drop_month(start)
+        self.assertFalse(ArchivedOrder.objects.exists())
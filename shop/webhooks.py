@@ -0,0 +1,122 @@
+import datetime
+import hashlib
+import json
+import logging
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from shop.models import Order, WebhookEvent
+from shop.payment_status import apply_payment_status
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 15 * 60
+STORED_HEADERS = ('x-webhook-timestamp', 'x-webhook-signature', 'x-webhook-version', 'x-idempotency-key')
+
+
+def store_event(raw_body, headers):
+    """
+    Append a verified webhook to the inbox and return it.
+
+    Gateway retries carry the same body, so the body hash doubles as the
+    deduplication key; a repeat returns the event that is already stored.
+    """
+    decoded = raw_body.decode('utf-8')
+    payload = json.loads(decoded)
+    dedupe_key = hashlib.sha256(raw_body).hexdigest()
+    try:
+        with transaction.atomic():
+            return WebhookEvent.objects.create(
+                dedupe_key=dedupe_key,
+                event_type=payload.get('type', ''),
+                order_id=payload.get('data', {}).get('order', {}).get('order_id', ''),
+                body=decoded,
+                headers={name: headers[name] for name in STORED_HEADERS if name in headers},
+            )
+    except IntegrityError:
+        return WebhookEvent.objects.get(dedupe_key=dedupe_key)
+
+
+def process_event(event):
+    """Apply one payment webhook to its order."""
+    body = json.loads(event.body)
+    order_id = body['data']['order']['order_id']
+    transaction_status = body['data']['payment']['payment_status']
+    if transaction_status == "SUCCESS":
+        new_status = 'success'
+    elif transaction_status == "PENDING":
+        new_status = 'pending'
+    else:
+        new_status = 'failed'
+
+    # Only the payment columns are written, so a concurrent status transition
+    # or rollup claim on the same row is never overwritten. A late or
+    # repeated result that may not replace the current state changes nothing.
+    if apply_payment_status(order_id, new_status) is None and not Order.objects.filter(order_id=order_id).exists():
+        raise Order.DoesNotExist(f"Order {order_id} does not exist.")
+
+
+def retry_delay(attempts):
+    return datetime.timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def run_event(event_id):
+    """Process one event under a row lock, recording the outcome. Returns True on success."""
+    with transaction.atomic():
+        events = WebhookEvent.objects.filter(pk=event_id, status__in=('pending', 'failed'))
+        if connection.features.has_select_for_update_skip_locked:
+            events = events.select_for_update(skip_locked=True)
+        event = events.first()
+        if event is None:
+            return False
+        event.attempts += 1
+        try:
+            with transaction.atomic():
+                process_event(event)
+        except Exception as e:
+            logger.exception("Webhook %s failed", event.pk)
+            event.last_error = repr(e)
+            if event.attempts >= MAX_ATTEMPTS:
+                event.status = 'dead'
+            else:
+                event.status = 'failed'
+                event.next_attempt_at = timezone.now() + retry_delay(event.attempts)
+        else:
+            event.status = 'processed'
+            event.last_error = None
+            event.processed_at = timezone.now()
+        event.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'processed_at'])
+        return event.status == 'processed'
+
+
+def process_due_events(batch_size=100):
+    """
+    Process the next batch of due events in arrival order.
+
+    Events for the same order are applied strictly in order: once one of them
+    is waiting for a retry, later events for that order wait behind it.
+    Returns the number of events looked at.
+    """
+    now = timezone.now()
+    blocked = set(
+        WebhookEvent.objects.filter(status='failed', next_attempt_at__gt=now).values_list('order_id', flat=True)
+    )
+    due = list(
+        WebhookEvent.objects.filter(status__in=('pending', 'failed'), next_attempt_at__lte=now)
+        .order_by('id').values_list('id', 'order_id')[:batch_size]
+    )
+    for event_id, order_id in due:
+        if order_id in blocked:
+            continue
+        if not run_event(event_id):
+            blocked.add(order_id)
+    return len(due)
+
+
+def requeue_events(queryset):
+    """Send dead or failed events back to the inbox for another round of attempts."""
+    return queryset.exclude(status='processed').update(
+        status='pending', attempts=0, next_attempt_at=timezone.now(), last_error=None)
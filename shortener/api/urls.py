@@ -1,7 +1,7 @@
 from django.urls import path
-from shortener.api.views import CreateShortURL, RedirectShortURL
+from shortener.api.views import CreateShortURL, redirect_short_url
 
 urlpatterns = [
     path('shorten/', CreateShortURL.as_view(), name='create_short_url'),
-    path('<str:short_code>/', RedirectShortURL.as_view(), name='redirect_short_url'),
+    path('<str:short_code>/', redirect_short_url, name='redirect_short_url'),
 ]
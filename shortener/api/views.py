@@ -1,10 +1,13 @@
+import math
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.shortcuts import get_object_or_404, redirect
-from django.http import HttpResponseRedirect
-from shortener.models import ShortenedURL
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.views.decorators.http import require_GET
 from shortener.api.serializers import URLShortenSerializer
+from shortener.resolver import resolve
+from project.throttling import client_ip, take_token
 
 class CreateShortURL(APIView):
     def post(self, request, *args, **kwargs):
@@ -16,8 +19,19 @@ class CreateShortURL(APIView):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class RedirectShortURL(APIView):
-    permission_classes = []
-    def get(self, request, short_code, *args, **kwargs):
-        short_url = get_object_or_404(ShortenedURL, short_code=short_code)
-        return HttpResponseRedirect(short_url.original_url)
+@require_GET
+def redirect_short_url(request, short_code):
+    """
+    Table QR codes land here, so this is a plain Django view rather than an
+    APIView: no authentication, content negotiation or serializers, and no
+    database query once the code is cached.
+    """
+    wait = take_token('short_url:ip', client_ip(request))
+    if wait:
+        response = HttpResponse("Too many requests.", status=429)
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
+    original_url = resolve(short_code)
+    if original_url is None:
+        raise Http404("No such short URL.")
+    return HttpResponseRedirect(original_url)
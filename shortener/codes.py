@@ -0,0 +1,131 @@
+import string
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+# ASCII order, so without obfuscation consecutive codes also sort consecutively.
+ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+CODE_LENGTH = 6
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+
+# Affine permutation n -> (n * MULTIPLIER + OFFSET) mod CODE_SPACE. It is a
+# bijection because MULTIPLIER shares no factor with 62**6 = 2**6 * 31**6,
+# so distinct sequence values always give distinct codes.
+MULTIPLIER = 24_928_974_517
+OFFSET = 12_813_447_105
+INVERSE = pow(MULTIPLIER, -1, CODE_SPACE)
+
+SEQUENCE_NAME = 'short_url'
+BLOCK_SIZE = 100
+
+
+def encode(value):
+    """Base62-encode `value` as a fixed-width code."""
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(code):
+    value = 0
+    for char in code:
+        value = value * len(ALPHABET) + ALPHABET.index(char)
+    return value
+
+
+def value_to_code(value):
+    if settings.SHORT_CODE_OBFUSCATE:
+        value = (value * MULTIPLIER + OFFSET) % CODE_SPACE
+    return encode(value)
+
+
+def code_to_value(code):
+    """Invert value_to_code(), e.g. to see which sequence value issued a code."""
+    value = decode(code)
+    if settings.SHORT_CODE_OBFUSCATE:
+        value = (value - OFFSET) * INVERSE % CODE_SPACE
+    return value
+
+
+def allocate(count, name=SEQUENCE_NAME):
+    """
+    Claim `count` consecutive values from the named sequence and return the
+    first. One row lock per call, however large the range.
+    """
+    from shortener.models import ShortCodeSequence
+
+    with transaction.atomic():
+        ShortCodeSequence.objects.get_or_create(name=name)
+        sequence = ShortCodeSequence.objects.select_for_update().get(name=name)
+        start = sequence.next_value
+        if start + count > CODE_SPACE:
+            raise OverflowError("The short code space is exhausted.")
+        sequence.next_value = start + count
+        sequence.save(update_fields=['next_value'])
+    return start
+
+
+class BlockAllocator:
+    """
+    Hands out codes from a range of BLOCK_SIZE sequence values reserved by
+    this process, so the sequence row is touched once per block. Values left
+    in a block when the process exits are simply never used.
+    """
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.next = self.end = 0
+        self._lock = threading.Lock()
+
+    def next_code(self):
+        with self._lock:
+            if self.next >= self.end:
+                self.next = allocate(self.block_size)
+                self.end = self.next + self.block_size
+            value, self.next = self.next, self.next + 1
+        return value_to_code(value)
+
+
+allocator = BlockAllocator()
+
+
+def next_code():
+    return allocator.next_code()
+
+
+def reserve_codes(count):
+    """Reserve `count` fresh codes in one allocation, for bulk creation."""
+    start = allocate(count)
+    return [value_to_code(value) for value in range(start, start + count)]
+
+
+def create_short_urls(original_urls):
+    """
+    Create a ShortenedURL per URL with a single INSERT. Reserved codes that
+    clash with legacy random codes are swapped for fresh ones first; should
+    a clash still slip through, each row falls back to save()'s retries.
+    """
+    from shortener.models import ShortenedURL
+    from shortener.resolver import invalidate_short_url
+
+    codes = reserve_codes(len(original_urls))
+    while True:
+        taken = set(ShortenedURL.objects.filter(short_code__in=codes).values_list('short_code', flat=True))
+        if not taken:
+            break
+        codes = [code for code in codes if code not in taken] + reserve_codes(len(taken))
+
+    try:
+        with transaction.atomic():
+            short_urls = ShortenedURL.objects.bulk_create([
+                ShortenedURL(original_url=original_url, short_code=code)
+                for original_url, code in zip(original_urls, codes)
+            ])
+    except IntegrityError:
+        return [ShortenedURL.objects.create(original_url=original_url) for original_url in original_urls]
+    # Drop any "no such code" entries a scan may have cached for these codes.
+    invalidate_short_url(*codes)
+    return short_urls
@@ -1,7 +1,20 @@
-import string
-import random
-from django.db import models
-from django.utils.crypto import get_random_string
+from django.db import IntegrityError, models, transaction
+
+from shortener.codes import next_code
+from shortener.resolver import invalidate_short_url
+
+# Retries when an issued code is already taken by a legacy random code.
+MAX_CODE_ATTEMPTS = 5
+
+
+class ShortCodeSequence(models.Model):
+    """Next unallocated value of a short code sequence; see shortener.codes."""
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
 
 class ShortenedURL(models.Model):
     original_url = models.URLField(max_length=500)
@@ -9,12 +22,28 @@ class ShortenedURL(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
-        if not self.short_code:
-            self.short_code = self.generate_short_code()
-        super().save(*args, **kwargs)
+        # The code itself may have been edited; forget the old one too.
+        previous = ShortenedURL.objects.filter(pk=self.pk).values_list('short_code', flat=True).first() if self.pk else None
+        if self.short_code:
+            super().save(*args, **kwargs)
+        else:
+            self.save_with_new_code(*args, **kwargs)
+        invalidate_short_url(*{self.short_code, previous} - {None})
+
+    def save_with_new_code(self, *args, **kwargs):
+        for attempt in range(MAX_CODE_ATTEMPTS):
+            self.short_code = next_code()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == MAX_CODE_ATTEMPTS - 1:
+                    self.short_code = ''
+                    raise
 
-    def generate_short_code(self):
-        return get_random_string(6, allowed_chars=string.ascii_letters + string.digits)
+    def delete(self, *args, **kwargs):
+        invalidate_short_url(self.short_code)
+        return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"{self.original_url} -> {self.short_code}"
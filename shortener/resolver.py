@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+SHARED_TTL = 24 * 60 * 60
+LOCAL_TTL = 30  # bounds how long another process may serve an updated link
+LOCAL_SIZE = 10000
+MISSING = ''  # cached for unknown codes so scans of random codes stay off the database
+MISSING_TTL = 60
+
+
+class LocalLRU:
+    """A small thread-safe LRU whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self.entries.pop(key, None)
+
+
+local_urls = LocalLRU(LOCAL_SIZE, LOCAL_TTL)
+
+
+def url_key(short_code):
+    return f'short_url:{short_code}'
+
+
+def resolve(short_code):
+    """
+    Return the original URL for `short_code`, or None if there is none,
+    checking this process' LRU, then the shared cache, then the database.
+    """
+    url = local_urls.get(short_code)
+    if url is None:
+        url = cache.get(url_key(short_code))
+        if url is None:
+            from shortener.models import ShortenedURL
+
+            url = ShortenedURL.objects.filter(short_code=short_code).values_list('original_url', flat=True).first()
+            if url is None:
+                url = MISSING
+            cache.set(url_key(short_code), url, SHARED_TTL if url else MISSING_TTL)
+        local_urls.set(short_code, url)
+    return url or None
+
+
+def invalidate_short_url(*short_codes):
+    for short_code in short_codes:
+        local_urls.discard(short_code)
+    cache.delete_many([url_key(short_code) for short_code in short_codes])
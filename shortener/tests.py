@@ -1,3 +1,61 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from shortener import codes
+from shortener.models import ShortCodeSequence, ShortenedURL
+from shortener.resolver import local_urls, resolve
+
+
+class ShortCodeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_urls.entries.clear()
+        codes.allocator.next = codes.allocator.end = 0
+
+    def next_codes(self, count):
+        """The codes the sequence will issue next, without reserving them."""
+        start = ShortCodeSequence.objects.filter(name=codes.SEQUENCE_NAME).values_list('next_value', flat=True).first() or 0
+        return [codes.value_to_code(value) for value in range(start, start + count)]
+
+    def test_codes_round_trip(self):
+        for value in (0, 1, 61, 62, 123456789, codes.CODE_SPACE - 1):
+            code = codes.value_to_code(value)
+            self.assertEqual(len(code), codes.CODE_LENGTH)
+            self.assertEqual(codes.code_to_value(code), value)
+
+    @override_settings(SHORT_CODE_OBFUSCATE=False)
+    def test_plain_codes_ascend(self):
+        issued = [codes.value_to_code(value) for value in range(200)]
+        self.assertEqual(issued, sorted(issued))
+
+    def test_reservations_do_not_overlap(self):
+        first = codes.reserve_codes(50)
+        second = codes.reserve_codes(50)
+        self.assertEqual(len(set(first) | set(second)), 100)
+
+    def test_block_allocator_touches_the_sequence_once_per_block(self):
+        issued = [ShortenedURL.objects.create(original_url=f'https://example.com/{n}').short_code for n in range(5)]
+        self.assertEqual(len(set(issued)), 5)
+        self.assertEqual(ShortCodeSequence.objects.get().next_value, codes.BLOCK_SIZE)
+
+    def test_save_skips_a_code_taken_by_a_legacy_row(self):
+        taken = self.next_codes(1)[0]
+        ShortenedURL.objects.create(original_url='https://legacy.example.com/', short_code=taken)
+
+        short_url = ShortenedURL.objects.create(original_url='https://example.com/')
+        self.assertNotEqual(short_url.short_code, taken)
+
+    def test_bulk_create_skips_codes_taken_by_legacy_rows(self):
+        upcoming = self.next_codes(3)
+        ShortenedURL.objects.create(original_url='https://legacy.example.com/', short_code=upcoming[1])
+
+        created = codes.create_short_urls([f'https://example.com/{n}' for n in range(3)])
+        created_codes = [short_url.short_code for short_url in created]
+        self.assertEqual(len(set(created_codes)), 3)
+        self.assertNotIn(upcoming[1], created_codes)
+
+    def test_bulk_create_clears_cached_misses(self):
+        upcoming = self.next_codes(1)[0]
+        self.assertIsNone(resolve(upcoming))
+        codes.create_short_urls(['https://example.com/new'])
+        self.assertEqual(resolve(upcoming), 'https://example.com/new')